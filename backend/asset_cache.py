@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from disk_cache import DiskLRU
+
+# bump when a change to the generation pipeline changes its output
+ASSET_PIPELINE_VERSION = 2
+
+# parameters that change the served asset; anything else (e.g. render_video)
+# only affects side outputs and must not split the cache
+OUTPUT_PARAMS = (
+    "foreground_ratio",
+    "mc_resolution",
+    "mc_threshold",
+    "bake_texture",
+    "texture_resolution",
+    "model_format",
+    "remove_bg",
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+class AssetCache:
+    """
+    Content-addressed store of generated assets.
+
+    Entries live in `<root>/<key>/` where the key hashes the normalized
+    prompt, every output-affecting parameter, the model version and the
+    service-wide `mesh_options` that change the extracted mesh. Assets
+    are built in a staging directory and published with a single rename, so
+    a crash mid-generation can never leave a partial entry behind. Entries
+    are evicted least-recently-used first once `max_bytes` is exceeded.
+    """
+
+    ASSET_NAME = "model.obj"
+    META_NAME = "meta.json"
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        model_version: str,
+        max_bytes: int = 10 * 1024**3,
+        mesh_options: Optional[Dict[str, Any]] = None,
+    ):
+        self.root = Path(root)
+        self.model_version = model_version
+        self.mesh_options = mesh_options or {}
+        self.staging_root = self.root / ".staging"
+        # anything left in staging belongs to a generation that never finished
+        shutil.rmtree(self.staging_root, ignore_errors=True)
+        self.staging_root.mkdir(parents=True, exist_ok=True)
+        self.entries = DiskLRU(self.root, max_bytes)
+
+    def key(self, prompt: str, params: Dict[str, Any]) -> str:
+        payload = {
+            "prompt": normalize_prompt(prompt),
+            "params": {
+                name: params[name] for name in OUTPUT_PARAMS if name in params
+            },
+            "model_version": self.model_version,
+            "mesh_options": self.mesh_options,
+            "pipeline_version": ASSET_PIPELINE_VERSION,
+        }
+        blob = json.dumps(payload, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the asset path for `key`, or None on a miss."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        asset_path = entry / self.ASSET_NAME
+        return asset_path if asset_path.is_file() else None
+
+    def metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        meta_path = self.entries.path(key) / self.META_NAME
+        if not meta_path.is_file():
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def accepts(self, asset_path: Union[str, Path], params: Dict[str, Any]) -> bool:
+        """
+        Whether `asset_path`, found by some other route than its exact key
+        (e.g. a semantic match on the prompt), is a live entry produced with
+        the same output parameters and model as a request for `params`.
+        """
+        key = Path(asset_path).parent.name
+        if self.lookup(key) is None:
+            return False
+        metadata = self.metadata(key) or {}
+        if metadata.get("model_version") != self.model_version:
+            return False
+        if metadata.get("mesh_options", {}) != self.mesh_options:
+            return False
+        if metadata.get("pipeline_version") != ASSET_PIPELINE_VERSION:
+            return False
+        cached_params = metadata.get("params", {})
+        return all(
+            cached_params.get(name) == params[name]
+            for name in OUTPUT_PARAMS
+            if name in params
+        )
+
+    def staging_dir(self, key: str) -> Path:
+        path = self.staging_root / f"{key}-{uuid.uuid4().hex}"
+        path.mkdir(parents=True)
+        return path
+
+    def publish(self, key: str, staging_dir: Path, metadata: Dict[str, Any]) -> Path:
+        """Atomically move a finished staging directory into the cache."""
+        if not (staging_dir / self.ASSET_NAME).is_file():
+            raise FileNotFoundError(f"{staging_dir} has no {self.ASSET_NAME}")
+        metadata = dict(
+            metadata,
+            key=key,
+            model_version=self.model_version,
+            mesh_options=self.mesh_options,
+            pipeline_version=ASSET_PIPELINE_VERSION,
+            created_at=time.time(),
+        )
+        with open(staging_dir / self.META_NAME, "w") as f:
+            json.dump(metadata, f, indent=2, default=str)
+
+        target = self.entries.path(key)
+        try:
+            os.rename(staging_dir, target)
+        except OSError:
+            # someone else published the same key first; keep theirs
+            if not target.exists():
+                raise
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        self.entries.add(key)
+        return target / self.ASSET_NAME
+
+    def discard_staging(self, staging_dir: Path):
+        shutil.rmtree(staging_dir, ignore_errors=True)
@@ -0,0 +1,201 @@
+import logging
+import queue
+from typing import List, Optional, Sequence
+
+import numpy as np
+import onnxruntime as ort
+import rembg
+from PIL import Image, ImageOps
+
+from batching import MicroBatcher
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Salient-object models whose pre/post-processing is identical up to the
+# normalization constants and input size, so several images can share one
+# ONNX call. Other rembg models go through `rembg.remove` one at a time.
+SALIENCY_MODELS = {
+    "u2net": (IMAGENET_MEAN, IMAGENET_STD, 320),
+    "u2netp": (IMAGENET_MEAN, IMAGENET_STD, 320),
+    "u2net_human_seg": (IMAGENET_MEAN, IMAGENET_STD, 320),
+    "u2net_custom": (IMAGENET_MEAN, IMAGENET_STD, 320),
+    "silueta": (IMAGENET_MEAN, IMAGENET_STD, 320),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), 1024),
+    "isnet-anime": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), 1024),
+    "bria-rmbg": (IMAGENET_MEAN, IMAGENET_STD, 1024),
+}
+
+
+def has_alpha(image: Image.Image) -> bool:
+    """True if `image` already carries a (non-opaque) alpha matte."""
+    return image.mode == "RGBA" and image.getextrema()[3][0] < 255
+
+
+def session_options(intra_op_threads: int, inter_op_threads: int) -> ort.SessionOptions:
+    sess_opts = ort.SessionOptions()
+    # 0 lets ONNX Runtime use every core, which oversubscribes the CPU as
+    # soon as more than one session (or torch) runs at the same time
+    sess_opts.intra_op_num_threads = intra_op_threads
+    sess_opts.inter_op_num_threads = inter_op_threads
+    sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return sess_opts
+
+
+class BackgroundRemover:
+    """
+    Background matting stage: a pool of `num_sessions` rembg sessions, each
+    with explicit ONNX Runtime thread counts, fed by a `MicroBatcher` so
+    images submitted concurrently from several threads share one inference
+    call (when the model accepts a dynamic batch dimension).
+
+    With `mask_size` set (fast mode) the image is downscaled with a cheap
+    filter before normalization, the network runs at `mask_size` x
+    `mask_size` when its input resolution is dynamic, and the mask is
+    upsampled bilinearly instead of with Lanczos.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "u2net",
+        num_sessions: int = 1,
+        intra_op_threads: int = 1,
+        inter_op_threads: int = 1,
+        max_batch_size: int = 4,
+        window: float = 0.01,
+        mask_size: Optional[int] = None,
+        **session_kwargs,
+    ):
+        assert num_sessions >= 1, "num_sessions must be a positive integer."
+        self.model_name = model_name
+        self.num_sessions = num_sessions
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.mask_size = mask_size
+
+        self._sessions: "queue.Queue" = queue.Queue()
+        for _ in range(num_sessions):
+            self._sessions.put(
+                rembg.new_session(
+                    model_name,
+                    sess_opts=session_options(intra_op_threads, inter_op_threads),
+                    **session_kwargs,
+                )
+            )
+
+        session = self._sessions.queue[0]
+        model_input = session.inner_session.get_inputs()[0]
+        self.input_name = model_input.name
+        # symbolic dimensions show up as strings (or None)
+        batch_dim, _, height_dim, width_dim = model_input.shape
+        self.dynamic_batch = not isinstance(batch_dim, int)
+        self.dynamic_size = not isinstance(height_dim, int) and not isinstance(
+            width_dim, int
+        )
+        self.batched = model_name in SALIENCY_MODELS
+        if self.batched:
+            self.mean, self.std, self.input_size = SALIENCY_MODELS[model_name]
+            if mask_size is not None:
+                if self.dynamic_size:
+                    self.input_size = mask_size
+                else:
+                    logging.warning(
+                        "%s has a fixed %dx%d input, fast mode only changes resampling",
+                        model_name,
+                        height_dim,
+                        width_dim,
+                    )
+        else:
+            logging.warning(
+                "%s is not batchable, images are matted one at a time", model_name
+            )
+
+        self.batcher = MicroBatcher(
+            self._remove_batch,
+            max_batch_size=max_batch_size if self.batched else 1,
+            window=window,
+            name="rembg-batcher",
+            concurrency=num_sessions,
+        )
+
+    def __call__(self, image: Image.Image, force: bool = False) -> Image.Image:
+        """Matte one image; blocks until its batch has run."""
+        if has_alpha(image) and not force:
+            return image
+        return self.batcher(image)
+
+    def remove(self, images: Sequence[Image.Image]) -> List[Image.Image]:
+        """Matte several images at once, batching them with other callers."""
+        futures = [
+            None if has_alpha(image) else self.batcher.submit(image)
+            for image in images
+        ]
+        return [
+            image if future is None else future.result()
+            for image, future in zip(images, futures)
+        ]
+
+    def _remove_batch(self, images: List[Image.Image]) -> List[Image.Image]:
+        images = [ImageOps.exif_transpose(image) for image in images]
+        session = self._sessions.get()
+        try:
+            if not self.batched:
+                return [rembg.remove(image, session=session) for image in images]
+            inputs = np.stack([self.normalize(image) for image in images])
+            if self.dynamic_batch:
+                preds = session.inner_session.run(None, {self.input_name: inputs})[0]
+            else:
+                preds = np.concatenate(
+                    [
+                        session.inner_session.run(
+                            None, {self.input_name: inputs[i : i + 1]}
+                        )[0]
+                        for i in range(len(images))
+                    ]
+                )
+        finally:
+            self._sessions.put(session)
+        return [self.cutout(image, pred[0]) for image, pred in zip(images, preds)]
+
+    def normalize(self, image: Image.Image) -> np.ndarray:
+        size = (self.input_size, self.input_size)
+        image = image.convert("RGB")
+        if self.mask_size is not None:
+            # box-filter down first, Lanczos on a full-size image dominates
+            image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        else:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        x = np.asarray(image, dtype=np.float32)
+        x = x / max(float(x.max()), 1e-6)
+        x = (x - np.array(self.mean, dtype=np.float32)) / np.array(
+            self.std, dtype=np.float32
+        )
+        return x.transpose(2, 0, 1)
+
+    def cutout(self, image: Image.Image, pred: np.ndarray) -> Image.Image:
+        lo, hi = float(pred.min()), float(pred.max())
+        pred = (pred - lo) / max(hi - lo, 1e-6)
+        mask = Image.fromarray((pred.clip(0, 1) * 255).astype(np.uint8))
+        resample = (
+            Image.Resampling.BILINEAR
+            if self.mask_size is not None
+            else Image.Resampling.LANCZOS
+        )
+        mask = mask.resize(image.size, resample)
+        return Image.composite(image, Image.new("RGBA", image.size, 0), mask)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "sessions": self.num_sessions,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "mask_size": self.mask_size,
+            "batches": self.batcher.num_batches,
+            "images": self.batcher.num_items,
+            "mean_batch_size": self.batcher.mean_batch_size,
+        }
+
+    def close(self):
+        self.batcher.close()
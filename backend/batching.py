@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and hands them to `batch_fn`
+    in groups. A batch is dispatched once `max_batch_size` items are queued or
+    `window` seconds have passed since the first item of the batch arrived.
+
+    `batch_fn` receives a list of items and must return a sequence of results
+    of the same length, in order. With `concurrency > 1` that many batches
+    can be collected and run at once, e.g. when `batch_fn` dispatches to a
+    pool of worker processes.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        window: float = 0.02,
+        name: str = "batcher",
+        concurrency: int = 1,
+    ):
+        assert max_batch_size >= 1, "max_batch_size must be a positive integer."
+        assert window >= 0, "window must be non-negative."
+        assert concurrency >= 1, "concurrency must be a positive integer."
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.name = name
+        self.concurrency = concurrency
+        self.num_batches = 0
+        self.num_items = 0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"{name}-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item: Any) -> Future:
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def close(self):
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.num_items / self.num_batches if self.num_batches else 0.0
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = (
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if entry is None:
+                # re-queue the sentinel so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logging.error("%s: batch of %d failed: %s", self.name, len(items), e)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.num_batches += 1
+                self.num_items += len(items)
+            for future, result in zip(futures, results):
+                future.set_result(result)
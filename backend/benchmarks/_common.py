@@ -0,0 +1,56 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import sys
+from typing import List, Optional
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_images(paths: Optional[List[str]], count: int = 1) -> List[Image.Image]:
+    """
+    Open `paths`, or draw `count` simple synthetic objects (a shaded ellipse
+    on grey) so that the meshes being compared are not empty.
+    """
+    if paths:
+        return [Image.open(path).convert("RGB") for path in paths]
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (512, 512), (127, 127, 127))
+        draw = ImageDraw.Draw(image)
+        w, h = rng.integers(120, 200, size=2)
+        color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+        draw.ellipse([256 - w, 256 - h, 256 + w, 256 + h], fill=color)
+        images.append(image)
+    return images
+
+
+def chamfer_distance(mesh_a, mesh_b, num_points: int = 20000, chunk: int = 4096) -> float:
+    """
+    Symmetric Chamfer distance (mean of squared nearest-neighbour distances
+    in both directions) between points sampled on the surfaces of two
+    trimesh meshes.
+    """
+    if len(mesh_a.faces) == 0 or len(mesh_b.faces) == 0:
+        return float("inf")
+    np.random.seed(0)
+    a = torch.from_numpy(np.asarray(mesh_a.sample(num_points), dtype=np.float32))
+    b = torch.from_numpy(np.asarray(mesh_b.sample(num_points), dtype=np.float32))
+
+    def one_way(src, dst):
+        nearest = [
+            torch.cdist(src[i : i + chunk], dst).min(dim=1).values
+            for i in range(0, len(src), chunk)
+        ]
+        return torch.cat(nearest).pow(2).mean().item()
+
+    return one_way(a, b) + one_way(b, a)
+
+
+def synchronize(device: str):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
@@ -0,0 +1,96 @@
+"""
+Matting throughput of `BackgroundRemover` against the per-image
+`remove_background` path it replaces (one default rembg session, one image
+per call), with requests arriving from several threads at once.
+
+Each configuration is a number of ONNX sessions, their intra-op threads and
+the batch size; `--fast` adds the same configurations with the mask
+computed at `--mask-size` and upsampled. The mask IoU against the baseline
+shows what fast mode costs in quality.
+
+    python benchmarks/bench_background_removal.py --sessions 1 2 --intra-threads 1 2 --fast
+"""
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rembg
+
+from _common import load_images
+from background_removal import BackgroundRemover
+from tsr.utils import remove_background
+
+
+def run(fn, images, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(fn, images))
+        return results, time.perf_counter() - start
+
+
+def mask_iou(a, b):
+    a = np.asarray(a)[..., 3] > 127
+    b = np.asarray(b)[..., 3] > 127
+    union = np.logical_or(a, b).sum()
+    return np.logical_and(a, b).sum() / union if union else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="*", help="input images (default: synthetic)")
+    parser.add_argument("--model", default="u2net")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--intra-threads", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--fast", action="store_true")
+    parser.add_argument("--mask-size", type=int, default=160)
+    args = parser.parse_args()
+
+    images = load_images(args.images, count=args.requests)
+    images = list(itertools.islice(itertools.cycle(images), args.requests))
+
+    session = rembg.new_session(args.model)
+    remove_background(images[0], session)
+    reference, elapsed = run(
+        lambda image: remove_background(image, session), images, args.concurrency
+    )
+    baseline = args.requests / elapsed
+
+    print(
+        f"{'path':>10} {'sessions':>8} {'intra':>6} {'batch':>6} {'wall_s':>8} "
+        f"{'img/s':>8} {'speedup':>8} {'iou':>6}"
+    )
+    print(
+        f"{'current':>10} {1:>8} {'-':>6} {1:>6} {elapsed:>8.2f} "
+        f"{baseline:>8.2f} {1.0:>8.2f} {1.0:>6.3f}"
+    )
+    mask_sizes = [None, args.mask_size] if args.fast else [None]
+    for mask_size, num_sessions, intra, batch_size in itertools.product(
+        mask_sizes, args.sessions, args.intra_threads, args.batch_sizes
+    ):
+        remover = BackgroundRemover(
+            args.model,
+            num_sessions=num_sessions,
+            intra_op_threads=intra,
+            max_batch_size=batch_size,
+            mask_size=mask_size,
+        )
+        remover.remove(images[:num_sessions])
+        results, elapsed = run(remover, images, args.concurrency)
+        remover.close()
+
+        throughput = args.requests / elapsed
+        iou = np.mean([mask_iou(a, b) for a, b in zip(reference, results)])
+        print(
+            f"{'fast' if mask_size else 'batched':>10} {num_sessions:>8} {intra:>6} "
+            f"{batch_size:>6} {elapsed:>8.2f} {throughput:>8.2f} "
+            f"{throughput / baseline:>8.2f} {iou:>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Throughput of TSR reconstruction behind MicroBatcher as a function of the
+batching window, under a burst of concurrent requests.
+
+    python benchmarks/bench_batching.py --requests 16 --windows 0 10 25 50 100
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import MicroBatcher
+from tsr.system import TSR
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 10, 25, 50, 100])
+    args = parser.parse_args()
+
+    model = TSR.from_pretrained(
+        args.model_path, config_name="config.yaml", weight_name="model.ckpt"
+    ).to(args.device)
+
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(0, 255, (512, 512, 3), dtype=np.uint8))
+        for _ in range(args.requests)
+    ]
+
+    def reconstruct_batch(batch):
+        with torch.no_grad():
+            return list(model(batch, device=args.device))
+
+    # warm up kernels and allocator before timing
+    reconstruct_batch(images[:1])
+
+    print(f"{'window_ms':>10} {'mean_batch':>10} {'wall_s':>8} {'req/s':>8}")
+    for window_ms in args.windows:
+        batcher = MicroBatcher(
+            reconstruct_batch,
+            max_batch_size=args.max_batch_size,
+            window=window_ms / 1000.0,
+        )
+        with ThreadPoolExecutor(max_workers=args.requests) as pool:
+            start = time.perf_counter()
+            list(pool.map(batcher, images))
+            elapsed = time.perf_counter() - start
+        batcher.close()
+        print(
+            f"{window_ms:>10.1f} {batcher.mean_batch_size:>10.2f} "
+            f"{elapsed:>8.2f} {args.requests / elapsed:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
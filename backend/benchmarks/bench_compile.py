@@ -0,0 +1,62 @@
+"""
+Latency of TSR reconstruction and mesh extraction in eager mode and with
+`TSR.enable_compile`, after a warmup pass (compile time is reported
+separately, it is paid once in `startup_event`).
+
+    python benchmarks/bench_compile.py --device cpu --mc-resolution 128
+"""
+import argparse
+import time
+
+import torch
+
+from _common import load_images, synchronize
+from tsr.system import TSR
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--image", nargs="*", help="conditioning images, already preprocessed")
+    parser.add_argument("--mode", default="default", help="torch.compile mode")
+    parser.add_argument("--mc-resolution", type=int, default=256)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model = TSR.from_pretrained(
+        args.model_path, config_name="config.yaml", weight_name="model.ckpt"
+    ).to(args.device)
+    model.renderer.set_chunk_size(args.chunk_size)
+    images = load_images(args.image)
+
+    def run():
+        with torch.no_grad():
+            synchronize(args.device)
+            start = time.perf_counter()
+            scene_codes = model(images, device=args.device)
+            synchronize(args.device)
+            forward_s = time.perf_counter() - start
+            model.extract_mesh(
+                scene_codes, has_vertex_color=False, resolution=args.mc_resolution
+            )
+            synchronize(args.device)
+            mesh_s = time.perf_counter() - start - forward_s
+        return forward_s, mesh_s
+
+    print(f"{'mode':>8} {'warmup_s':>9} {'forward_s':>10} {'mesh_s':>8}")
+    for mode in ["eager", "compiled"]:
+        if mode == "compiled":
+            model.enable_compile(mode=args.mode)
+        start = time.perf_counter()
+        run()
+        warmup_s = time.perf_counter() - start
+        timings = [run() for _ in range(args.repeats)]
+        forward_s = min(t[0] for t in timings)
+        mesh_s = min(t[1] for t in timings)
+        print(f"{mode:>8} {warmup_s:>9.2f} {forward_s:>10.3f} {mesh_s:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Re-extraction latency with `DensityVolumeCache`: `TSR.extract_mesh`
+without a cache, the first extraction with one (evaluates and stores the
+fp16 volume), then re-extractions at other thresholds, which only run
+marching cubes on the memory-mapped volume. With `--lod` a resolution whose
+lattice subsamples the cached one, (R - 1) / 2 + 1, is extracted from it as
+well. The Chamfer distance is against an uncached extraction with the same
+settings and shows what storing the volume in fp16 costs.
+
+    python benchmarks/bench_density_cache.py --resolutions 257 513 --thresholds 10 25 40 --lod
+"""
+import argparse
+import tempfile
+import time
+
+import torch
+
+from _common import chamfer_distance, load_images
+from density_cache import DensityVolumeCache
+from tsr.system import TSR
+
+
+def timed_extract(model, scene_codes, resolution, threshold, slab_size, cache=None):
+    start = time.perf_counter()
+    mesh = model.extract_mesh(
+        scene_codes,
+        has_vertex_color=False,
+        resolution=resolution,
+        threshold=threshold,
+        slab_size=slab_size,
+        density_cache=cache,
+    )[0]
+    return mesh, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[257])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[10, 25, 40])
+    parser.add_argument("--slab-size", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--lod", action="store_true")
+    args = parser.parse_args()
+
+    model = TSR.from_pretrained(args.model_path, "config.yaml", "model.ckpt")
+    model.renderer.set_chunk_size(args.chunk_size)
+    with torch.no_grad():
+        scene_codes = model(load_images(None)[:1], device="cpu")
+
+    print(
+        f"{'res':>5} {'thresh':>7} {'path':>9} {'wall_s':>8} {'speedup':>8} "
+        f"{'faces':>9} {'chamfer':>10} {'cache_mb':>9}"
+    )
+    for resolution in args.resolutions:
+        with tempfile.TemporaryDirectory() as root:
+            cache = DensityVolumeCache(root, "bench")
+            runs = [("miss", resolution, args.thresholds[0])]
+            runs += [("hit", resolution, t) for t in args.thresholds]
+            if args.lod and resolution % 2 == 1:
+                runs += [("lod", (resolution - 1) // 2 + 1, t) for t in args.thresholds]
+            for path, res, threshold in runs:
+                reference, uncached_s = timed_extract(
+                    model, scene_codes, res, threshold, args.slab_size
+                )
+                mesh, elapsed = timed_extract(
+                    model, scene_codes, res, threshold, args.slab_size, cache
+                )
+                print(
+                    f"{res:>5} {threshold:>7g} {path:>9} {elapsed:>8.2f} "
+                    f"{uncached_s / elapsed:>8.2f} {len(mesh.faces):>9} "
+                    f"{chamfer_distance(reference, mesh):>10.2e} "
+                    f"{cache.volumes.total_bytes / 1024**2:>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Per-layer latency of the backbone attention with separate and fused q/k/v
+projections, at TripoSR's shapes: 3x32x32 triplane tokens attending to
+themselves and to the 1025 DINO image tokens. Needs no model weights.
+
+    python benchmarks/bench_fused_attention.py --batch-size 1 --repeats 10
+"""
+import argparse
+import time
+
+import torch
+
+from _common import synchronize
+from tsr.models.transformer.attention import Attention
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--tokens", type=int, default=3 * 32 * 32)
+    parser.add_argument("--encoder-tokens", type=int, default=1025)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--cross-dim", type=int, default=768)
+    parser.add_argument("--heads", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    hidden_states = torch.randn(
+        args.batch_size, args.tokens, args.dim, device=args.device
+    )
+    encoder_hidden_states = torch.randn(
+        args.batch_size, args.encoder_tokens, args.cross_dim, device=args.device
+    )
+
+    def timed(fn):
+        fn()
+        synchronize(args.device)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            fn()
+        synchronize(args.device)
+        return (time.perf_counter() - start) / args.repeats * 1000
+
+    print(f"{'layer':>6} {'proj_ms':>8} {'fused_ms':>9} {'attn_ms':>8} {'fused_ms':>9} {'max_err':>9}")
+    for name, cross_dim, encoder_states in [
+        ("attn1", None, None),
+        ("attn2", args.cross_dim, encoder_hidden_states),
+    ]:
+        attn = Attention(
+            args.dim,
+            cross_attention_dim=cross_dim,
+            heads=args.heads,
+            dim_head=args.dim // args.heads,
+        ).to(args.device)
+        with torch.no_grad():
+            reference = attn(hidden_states, encoder_states)
+            proj_ms = timed(lambda: attn.project_qkv(hidden_states, encoder_states))
+            attn_ms = timed(lambda: attn(hidden_states, encoder_states))
+            attn.fuse_projections()
+            fused = attn(hidden_states, encoder_states)
+            fused_proj_ms = timed(
+                lambda: attn.project_qkv(hidden_states, encoder_states)
+            )
+            fused_attn_ms = timed(lambda: attn(hidden_states, encoder_states))
+        max_err = (fused - reference).abs().max().item()
+        print(
+            f"{name:>6} {proj_ms:>8.2f} {fused_proj_ms:>9.2f} "
+            f"{attn_ms:>8.2f} {fused_attn_ms:>9.2f} {max_err:>9.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Dense against coarse-to-fine density evaluation in `TSR.extract_mesh`:
+decoder evaluations, wall time of the density grid and of the whole
+extraction, and the Chamfer distance between the two meshes.
+
+    python benchmarks/bench_hierarchical_extraction.py --resolutions 256 512 --block-sizes 8 16
+"""
+import argparse
+import time
+
+import torch
+
+from _common import chamfer_distance, load_images, synchronize
+from tsr.system import TSR
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--image", nargs="*", help="conditioning images, already preprocessed")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[8, 16])
+    parser.add_argument("--margin", type=float, default=5.0)
+    parser.add_argument("--threshold", type=float, default=25.0)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    args = parser.parse_args()
+
+    model = TSR.from_pretrained(
+        args.model_path, config_name="config.yaml", weight_name="model.ckpt"
+    ).to(args.device)
+    model.renderer.set_chunk_size(args.chunk_size)
+    with torch.no_grad():
+        scene_codes = model(load_images(args.image)[:1], device=args.device)
+
+    def run(resolution, block_size):
+        synchronize(args.device)
+        start = time.perf_counter()
+        _, evaluations = model.density_grid(
+            scene_codes[0], resolution, args.threshold, block_size, args.margin
+        )
+        synchronize(args.device)
+        density_s = time.perf_counter() - start
+        start = time.perf_counter()
+        mesh = model.extract_mesh(
+            scene_codes,
+            has_vertex_color=False,
+            resolution=resolution,
+            threshold=args.threshold,
+            coarse_block_size=block_size,
+            refine_margin=args.margin,
+        )[0]
+        synchronize(args.device)
+        return evaluations, density_s, time.perf_counter() - start, mesh
+
+    print(
+        f"{'res':>5} {'block':>6} {'evals':>11} {'evals_%':>8} {'density_s':>10} "
+        f"{'extract_s':>10} {'speedup':>8} {'chamfer':>10}"
+    )
+    for resolution in args.resolutions:
+        dense = None
+        for block_size in [0] + args.block_sizes:
+            evaluations, density_s, extract_s, mesh = run(resolution, block_size)
+            if dense is None:
+                dense = evaluations, extract_s, mesh
+            chamfer = chamfer_distance(dense[2], mesh) if block_size else 0.0
+            print(
+                f"{resolution:>5} {block_size or 'dense':>6} {evaluations:>11} "
+                f"{100 * evaluations / dense[0]:>8.1f} {density_s:>10.2f} "
+                f"{extract_s:>10.2f} {dense[1] / extract_s:>8.2f} {chamfer:>10.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Equivalence and speed of `TriplaneNeRFRenderer.query_lattice` (each plane
+sampled once on its 2D lattice, first decoder layer folded into per-plane
+projections) against the per-point `query_triplane` it replaces in
+`TSR.extract_mesh`.
+
+With `--model-path` the decoder and a triplane come from a real model and
+image; without it a decoder with TripoSR's shape and random weights is
+used. `--quantize` runs the int8 decoder, which takes the unfolded
+broadcasting path.
+
+    python benchmarks/bench_lattice_query.py --resolutions 64 128 256
+"""
+import argparse
+import time
+
+import torch
+
+from _common import load_images
+from tsr.models.nerf_renderer import TriplaneNeRFRenderer
+from tsr.models.network_utils import NeRFMLP
+from tsr.utils import scale_tensor
+
+
+def random_setup(seed=0):
+    torch.manual_seed(seed)
+    renderer = TriplaneNeRFRenderer(
+        {
+            "radius": 0.87,
+            "feature_reduction": "concat",
+            "density_activation": "trunc_exp",
+            "density_bias": -1.0,
+            "color_activation": "sigmoid",
+        }
+    )
+    decoder = NeRFMLP(
+        {"in_channels": 120, "n_neurons": 64, "n_hidden_layers": 9, "activation": "silu"}
+    )
+    triplane = torch.randn(3, 40, 64, 64)
+    return renderer, decoder, triplane
+
+
+def model_setup(model_path, device):
+    from tsr.system import TSR
+
+    model = TSR.from_pretrained(model_path, "config.yaml", "model.ckpt").to(device)
+    with torch.no_grad():
+        triplane = model(load_images(None), device=device)[0]
+    return model.renderer, model.decoder, triplane
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[64, 128])
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--quantize", action="store_true")
+    args = parser.parse_args()
+
+    if args.model_path:
+        renderer, decoder, triplane = model_setup(args.model_path, args.device)
+    else:
+        renderer, decoder, triplane = random_setup()
+    if args.quantize:
+        decoder = torch.ao.quantization.quantize_dynamic(
+            decoder, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    renderer.set_chunk_size(args.chunk_size)
+    triplane = triplane.to(args.device)
+
+    print(
+        f"{'res':>5} {'samples_pt':>12} {'samples_lat':>12} {'point_s':>8} "
+        f"{'lattice_s':>9} {'speedup':>8} {'max_abs':>9} {'max_rel':>9}"
+    )
+    for resolution in args.resolutions:
+        axis = torch.linspace(0, 1, resolution, device=args.device)
+        x, y, z = torch.meshgrid(axis, axis, axis, indexing="ij")
+        points = torch.stack((x, y, z), dim=-1).reshape(-1, 3)
+        radius = renderer.cfg.radius
+
+        with torch.no_grad():
+            start = time.perf_counter()
+            reference = renderer.query_triplane(
+                decoder, scale_tensor(points, (0, 1), (-radius, radius)), triplane
+            )["density_act"]
+            point_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            lattice = renderer.query_lattice(
+                decoder, scale_tensor(axis, (0, 1), (-radius, radius)), triplane
+            )["density_act"]
+            lattice_s = time.perf_counter() - start
+
+        diff = (lattice - reference).abs()
+        max_rel = (diff / reference.abs().clamp_min(1e-6)).max().item()
+        print(
+            f"{resolution:>5} {3 * resolution**3:>12} {3 * resolution**2:>12} "
+            f"{point_s:>8.2f} {lattice_s:>9.2f} {point_s / lattice_s:>8.2f} "
+            f"{diff.max().item():>9.2e} {max_rel:>9.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
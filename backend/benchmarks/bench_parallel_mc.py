@@ -0,0 +1,83 @@
+"""
+Scaling of block-wise CPU marching cubes (`MarchingCubeHelper` with
+`num_workers` > 1) across worker counts, against the single-threaded
+torchmcubes call on the whole volume.
+
+The density volume comes from a real model with `--model-path`, otherwise
+from a synthetic field of overlapping blobs with a similar surface area.
+
+    python benchmarks/bench_parallel_mc.py --resolutions 256 512 --workers 1 2 4 8
+"""
+import argparse
+import time
+
+import torch
+
+from _common import load_images
+from tsr.models.isosurface import MarchingCubeHelper
+
+
+def synthetic_volume(resolution, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    centers = torch.rand(12, 3, generator=generator) * 0.5 + 0.25
+    radii = torch.rand(12, generator=generator) * 0.1 + 0.08
+    axis = torch.linspace(0, 1, resolution)
+    volume = torch.zeros(resolution, resolution, resolution)
+    for center, radius in zip(centers, radii):
+        dx = (axis - center[0]).pow(2)[:, None, None]
+        dy = (axis - center[1]).pow(2)[None, :, None]
+        dz = (axis - center[2]).pow(2)[None, None, :]
+        volume += torch.exp(-(dx + dy + dz) / (2 * radius**2))
+    return volume - 0.5
+
+
+def model_volume(model_path, resolution, threshold=25.0):
+    from tsr.system import TSR
+
+    model = TSR.from_pretrained(model_path, "config.yaml", "model.ckpt")
+    with torch.no_grad():
+        scene_codes = model(load_images(None)[:1], device="cpu")
+    density, _ = model.density_grid(scene_codes[0], resolution)
+    return density - threshold
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--block-size", type=int, default=64)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'res':>5} {'workers':>7} {'wall_s':>8} {'speedup':>8} "
+        f"{'vertices':>9} {'faces':>9}"
+    )
+    for resolution in args.resolutions:
+        if args.model_path:
+            volume = model_volume(args.model_path, resolution)
+        else:
+            volume = synthetic_volume(resolution)
+        baseline = None
+        for num_workers in args.workers:
+            helper = MarchingCubeHelper(
+                resolution, num_workers, args.block_size, args.executor
+            )
+            helper.triangulate(volume)  # start the pool, share the volume
+            timings = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                v_pos, t_pos_idx = helper.triangulate(volume)
+                timings.append(time.perf_counter() - start)
+            elapsed = min(timings)
+            baseline = baseline or elapsed
+            print(
+                f"{resolution:>5} {num_workers:>7} {elapsed:>8.3f} "
+                f"{baseline / elapsed:>8.2f} {len(v_pos):>9} {len(t_pos_idx):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latency of the TSR backbone and mesh extraction per precision mode, and mesh
+quality against fp32 as the Chamfer distance between the extracted surfaces.
+
+    python benchmarks/bench_precision.py --precisions fp32 bf16
+    python benchmarks/bench_precision.py --device cuda:0 --precisions fp32 fp16 bf16 --image chair.png
+"""
+import argparse
+import time
+
+import torch
+
+from _common import chamfer_distance, load_images, synchronize
+from tsr.system import TSR
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--image", nargs="*", help="conditioning images, already preprocessed")
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16"])
+    parser.add_argument("--mc-resolution", type=int, default=256)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model = TSR.from_pretrained(
+        args.model_path, config_name="config.yaml", weight_name="model.ckpt"
+    ).to(args.device)
+    model.renderer.set_chunk_size(args.chunk_size)
+    images = load_images(args.image)
+
+    def run():
+        with torch.no_grad():
+            synchronize(args.device)
+            start = time.perf_counter()
+            scene_codes = model(images, device=args.device)
+            synchronize(args.device)
+            forward_s = time.perf_counter() - start
+            meshes = model.extract_mesh(
+                scene_codes, has_vertex_color=False, resolution=args.mc_resolution
+            )
+            synchronize(args.device)
+            mesh_s = time.perf_counter() - start - forward_s
+        return forward_s, mesh_s, meshes
+
+    reference = None
+    print(f"{'precision':>9} {'forward_s':>10} {'mesh_s':>8} {'chamfer':>10}")
+    for precision in ["fp32"] + [p for p in args.precisions if p != "fp32"]:
+        model.set_precision(precision)
+        run()  # warm up kernels and allocator
+        timings = [run() for _ in range(args.repeats)]
+        forward_s = min(t[0] for t in timings)
+        mesh_s = min(t[1] for t in timings)
+        meshes = timings[-1][2]
+        if reference is None:
+            reference = meshes
+        chamfer = max(chamfer_distance(a, b) for a, b in zip(reference, meshes))
+        print(f"{precision:>9} {forward_s:>10.3f} {mesh_s:>8.3f} {chamfer:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Lookup latency of the in-process semantic cache index at different sizes.
+
+    python benchmarks/bench_semantic_cache.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import VectorIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "int8"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dims), dtype=np.float32)
+
+    print(f"{'entries':>10} {'dtype':>8} {'size_MB':>8} {'p50_ms':>8} {'p99_ms':>8} {'recall@1':>9}")
+    for size in args.sizes:
+        data = rng.standard_normal((size, args.dims), dtype=np.float32)
+        data /= np.linalg.norm(data, axis=1, keepdims=True)
+        # plant each query next to a known row to measure recall
+        targets = rng.choice(size, args.queries, replace=False)
+        data[targets] = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        data[targets] += 0.05 * rng.standard_normal((args.queries, args.dims))
+
+        for dtype in args.dtypes:
+            with tempfile.TemporaryDirectory() as index_dir:
+                index = VectorIndex(index_dir, args.dims, dtype=dtype)
+                for start in range(0, size, 100_000):
+                    index.add(data[start : start + 100_000])
+
+                index.search(queries[0], args.top_k)
+                latencies, hits = [], 0
+                for query, target in zip(queries, targets):
+                    start = time.perf_counter()
+                    _, rows = index.search(query, args.top_k)
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+                    hits += int(rows[0] == target)
+
+                size_mb = index.vectors.nbytes * size / index.capacity / 1024**2
+                print(
+                    f"{size:>10} {dtype:>8} {size_mb:>8.1f} "
+                    f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f} "
+                    f"{hits / args.queries:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Peak memory and wall time of `TSR.extract_mesh` with the full density
+volume against slab-wise streaming extraction, and the Chamfer distance
+between the meshes. Every configuration runs in a fresh process so its
+peak resident set size is its own.
+
+    python benchmarks/bench_slab_extraction.py --resolutions 256 512 --slab-sizes 16 64
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import torch
+
+from _common import chamfer_distance, load_images
+from tsr.system import TSR
+
+
+def extract(model_path, resolution, slab_size, chunk_size, results):
+    model = TSR.from_pretrained(model_path, "config.yaml", "model.ckpt")
+    model.renderer.set_chunk_size(chunk_size)
+    with torch.no_grad():
+        scene_codes = model(load_images(None)[:1], device="cpu")
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    mesh = model.extract_mesh(
+        scene_codes, has_vertex_color=False, resolution=resolution, slab_size=slab_size
+    )[0]
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put((elapsed, peak_mb, peak_mb - baseline_mb, mesh))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--slab-sizes", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    args = parser.parse_args()
+
+    context = mp.get_context("spawn")
+    print(
+        f"{'res':>5} {'slab':>6} {'wall_s':>8} {'peak_mb':>8} {'added_mb':>9} "
+        f"{'faces':>9} {'chamfer':>10}"
+    )
+    for resolution in args.resolutions:
+        dense = None
+        for slab_size in [0] + args.slab_sizes:
+            results = context.Queue()
+            process = context.Process(
+                target=extract,
+                args=(args.model_path, resolution, slab_size, args.chunk_size, results),
+            )
+            process.start()
+            elapsed, peak_mb, added_mb, mesh = results.get()
+            process.join()
+            if dense is None:
+                dense = mesh
+            chamfer = chamfer_distance(dense, mesh) if slab_size else 0.0
+            print(
+                f"{resolution:>5} {slab_size or 'full':>6} {elapsed:>8.2f} "
+                f"{peak_mb:>8.0f} {added_mb:>9.0f} {len(mesh.faces):>9} {chamfer:>10.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
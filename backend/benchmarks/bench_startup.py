@@ -0,0 +1,91 @@
+"""
+Time-to-first-ready of the model service, broken down by component, for a
+hub checkpoint and for an offline bundle (see build_model_bundle.py). Each
+configuration runs in a fresh process so nothing is shared between them;
+run it twice to see warm page-cache numbers.
+
+    python benchmarks/bench_startup.py --sources stabilityai/TripoSR output/bundles/triposr-v1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHILD = r"""
+import json, os, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+start = time.perf_counter()
+import rembg
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.getcwd())
+from tsr.system import TSR
+
+timings = {"import_s": time.perf_counter() - start}
+source, device, parallel = sys.argv[1], sys.argv[2], sys.argv[3] == "1"
+bundle = TSR.read_bundle_manifest(source)
+if bundle is not None and "rembg" in bundle:
+    os.environ["U2NET_HOME"] = os.path.join(source, bundle["rembg"])
+
+def timed(name, fn, *args, **kwargs):
+    t = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[name] = time.perf_counter() - t
+    return result
+
+load_start = time.perf_counter()
+if parallel:
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        session = pool.submit(timed, "rembg_load_s", rembg.new_session)
+        model = timed("tsr_load_s", TSR.from_pretrained, source, "config.yaml", "model.ckpt")
+        session.result()
+else:
+    model = timed("tsr_load_s", TSR.from_pretrained, source, "config.yaml", "model.ckpt")
+    timed("rembg_load_s", rembg.new_session)
+timings["load_wall_s"] = time.perf_counter() - load_start
+timed("to_device_s", model.to, device)
+with torch.no_grad():
+    timed("first_forward_s", model, [Image.new("RGB", (512, 512), (127, 127, 127))], device)
+timings["ready_s"] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sources", nargs="+", default=["stabilityai/TripoSR"])
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    columns = [
+        "import_s",
+        "tsr_load_s",
+        "rembg_load_s",
+        "load_wall_s",
+        "to_device_s",
+        "first_forward_s",
+        "ready_s",
+    ]
+    print(f"{'source':>40} {'parallel':>8} " + " ".join(f"{c:>15}" for c in columns))
+    for source in args.sources:
+        for parallel in ["0", "1"]:
+            output = subprocess.run(
+                [sys.executable, "-c", CHILD, source, args.device, parallel],
+                cwd=backend_dir,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            timings = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{source[-40:]:>40} {parallel:>8} "
+                + " ".join(f"{timings[c]:>15.2f}" for c in columns)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Reconstruction throughput of `InferenceWorkerPool` from 1 to N worker
+processes, each with a fixed number of pinned intra-op threads. All workers
+memory-map the same model bundle; the resident memory of the whole process
+tree is reported to show the weights are shared.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --threads-per-worker 2
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import load_images
+from worker_pool import InferenceWorkerPool, ensure_bundle
+
+
+def tree_pss_mb(pids):
+    # proportional set size splits shared pages between the processes
+    # mapping them, so the sum does not double count the shared weights
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return total_kb / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--bundle-root", default="output/bundles")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--no-pin", action="store_true")
+    args = parser.parse_args()
+
+    bundle_dir = ensure_bundle(args.model_path, args.bundle_root)
+    images = load_images(None, count=args.requests)
+
+    print(f"{'workers':>7} {'threads':>7} {'wall_s':>8} {'req/s':>8} {'speedup':>8} {'pss_mb':>8}")
+    baseline = None
+    for num_workers in args.workers:
+        pool = InferenceWorkerPool(
+            bundle_dir,
+            num_workers,
+            threads_per_worker=args.threads_per_worker,
+            pin_cpus=not args.no_pin,
+        )
+        # one warm-up request per worker
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            list(executor.map(pool.reconstruct, [[images[0]]] * num_workers))
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            start = time.perf_counter()
+            list(executor.map(pool.reconstruct, [[image] for image in images]))
+            elapsed = time.perf_counter() - start
+        pss_mb = tree_pss_mb([os.getpid()] + [p.pid for p in pool._processes])
+        pool.close()
+
+        throughput = args.requests / elapsed
+        baseline = baseline or throughput
+        print(
+            f"{num_workers:>7} {args.threads_per_worker:>7} {elapsed:>8.2f} "
+            f"{throughput:>8.2f} {throughput / baseline:>8.2f} {pss_mb:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Checks `EmbeddingCache` against local stub vectorizers: concurrent misses are
+coalesced into batched `embed_many` calls, repeated texts are served from
+memory and, after a restart, from SQLite, and two vectorizers sharing one
+store never see each other's vectors.
+
+    python benchmarks/validate_embedding_cache.py --callers 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache, vectorizer_namespace
+
+
+class StubVectorizer:
+    """Deterministic vectors; records the size of every `embed_many` call."""
+
+    def __init__(self, model: str, offset: float):
+        self.model = model
+        self.offset = offset
+        self.calls = []
+
+    def embed_many(self, texts):
+        self.calls.append(len(texts))
+        return [[self.offset + len(text), float(sum(map(ord, text)))] for text in texts]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = [f"object {i}" for i in range(args.callers)]
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "embeddings.sqlite3")
+
+        stub = StubVectorizer("stub-a", 0.0)
+        cache = EmbeddingCache(stub, path, vectorizer_namespace(stub), batch_window=0.05)
+        with ThreadPoolExecutor(args.callers) as pool:
+            first = list(pool.map(cache.embed, texts))
+        assert first == stub.embed_many(texts), "batched vectors differ"
+        stub.calls.pop()
+        print(f"batching: {args.callers} concurrent misses -> embed_many calls {stub.calls}")
+        assert len(stub.calls) < args.callers
+
+        calls = len(stub.calls)
+        assert cache.embed_many(texts) == first and len(stub.calls) == calls
+        cache.close()
+        cache = EmbeddingCache(stub, path, vectorizer_namespace(stub))
+        assert cache.embed_many(texts) == first and len(stub.calls) == calls
+        print(f"memoization: repeats served without a vectorizer call ({cache.hits} disk hits)")
+        cache.close()
+
+        other = StubVectorizer("stub-b", 1000.0)
+        cache = EmbeddingCache(other, path, vectorizer_namespace(other))
+        isolated = cache.embed_many(texts)
+        assert other.calls == [len(texts)], "namespaces share entries"
+        assert all(a != b for a, b in zip(first, isolated))
+        print(f"isolation: '{other.model}' recomputed all {len(texts)} texts")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
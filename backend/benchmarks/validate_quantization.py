@@ -0,0 +1,92 @@
+"""
+Validates the int8 dynamically quantized TSR against the fp32 model: error of
+the density field on the marching-cubes grid, agreement of the occupancy at
+the iso threshold, Chamfer distance between the extracted meshes, and the
+latency of both variants.
+
+    python benchmarks/validate_quantization.py --image chair.png --mc-resolution 256
+"""
+import argparse
+import time
+
+import torch
+
+from _common import chamfer_distance, load_images
+from tsr.system import TSR
+from tsr.utils import scale_tensor
+
+
+def density_grid(model, scene_code, resolution):
+    model.set_marching_cubes_resolution(resolution)
+    helper = model.isosurface_helper
+    with torch.no_grad():
+        return model.renderer.query_triplane(
+            model.decoder,
+            scale_tensor(
+                helper.grid_vertices,
+                helper.points_range,
+                (-model.renderer.cfg.radius, model.renderer.cfg.radius),
+            ),
+            scene_code,
+        )["density_act"].view(-1)
+
+
+def run(model, images, resolution):
+    start = time.perf_counter()
+    with torch.no_grad():
+        scene_codes = model(images, device="cpu")
+    forward_s = time.perf_counter() - start
+    start = time.perf_counter()
+    meshes = model.extract_mesh(scene_codes, has_vertex_color=False, resolution=resolution)
+    mesh_s = time.perf_counter() - start
+    return scene_codes, meshes, forward_s, mesh_s
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--image", nargs="*", help="conditioning images, already preprocessed")
+    parser.add_argument("--mc-resolution", type=int, default=256)
+    parser.add_argument("--threshold", type=float, default=25.0)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    args = parser.parse_args()
+
+    images = load_images(args.image)
+    models = {}
+    for name, quantize in [("fp32", False), ("int8", True)]:
+        models[name] = TSR.from_pretrained(
+            args.model_path,
+            config_name="config.yaml",
+            weight_name="model.ckpt",
+            quantize=quantize,
+        )
+        models[name].renderer.set_chunk_size(args.chunk_size)
+
+    ref_codes, ref_meshes, ref_forward_s, ref_mesh_s = run(
+        models["fp32"], images, args.mc_resolution
+    )
+    codes, meshes, forward_s, mesh_s = run(models["int8"], images, args.mc_resolution)
+
+    print(f"{'model':>6} {'forward_s':>10} {'mesh_s':>8}")
+    print(f"{'fp32':>6} {ref_forward_s:>10.3f} {ref_mesh_s:>8.3f}")
+    print(f"{'int8':>6} {forward_s:>10.3f} {mesh_s:>8.3f}")
+    print()
+
+    print(f"{'image':>5} {'code_err':>9} {'dens_err':>9} {'occ_iou':>8} {'chamfer':>10}")
+    for i, (ref_code, code) in enumerate(zip(ref_codes, codes)):
+        # same scene code for both decoders isolates the decoder error
+        ref_density = density_grid(models["fp32"], ref_code, args.mc_resolution)
+        density = density_grid(models["int8"], ref_code, args.mc_resolution)
+        density_err = (
+            (density - ref_density).abs().mean() / ref_density.abs().mean()
+        ).item()
+        ref_occ = ref_density > args.threshold
+        occ = density > args.threshold
+        iou = ((ref_occ & occ).sum() / (ref_occ | occ).sum().clamp(min=1)).item()
+        code_err = ((code - ref_code).norm() / ref_code.norm()).item()
+        chamfer = chamfer_distance(ref_meshes[i], meshes[i])
+        print(f"{i:>5} {code_err:>9.2e} {density_err:>9.2e} {iou:>8.4f} {chamfer:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
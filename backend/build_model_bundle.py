@@ -0,0 +1,53 @@
+"""
+Build an offline model bundle (see `TSR.save_bundle`) so that nodes can start
+without network access and with memory-mapped weights:
+
+    python build_model_bundle.py output/bundles/triposr-v1 --model-version triposr-v1
+    TSR_MODEL_PATH=output/bundles/triposr-v1 python main.py
+"""
+import argparse
+import os
+
+import rembg
+
+from tsr.system import TSR
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bundle_dir")
+    parser.add_argument("--model-path", default="stabilityai/TripoSR")
+    parser.add_argument("--config-name", default="config.yaml")
+    parser.add_argument("--weight-name", default="model.ckpt")
+    parser.add_argument(
+        "--model-version",
+        help="recorded in the manifest and used in cache keys, defaults to the source",
+    )
+    parser.add_argument("--rembg-model", default="u2net")
+    parser.add_argument("--no-rembg", action="store_true")
+    args = parser.parse_args()
+
+    model = TSR.from_pretrained(
+        args.model_path, config_name=args.config_name, weight_name=args.weight_name
+    )
+
+    rembg_model_path = None
+    if not args.no_rembg:
+        # creating a session downloads the model if it is not there yet
+        rembg.new_session(args.rembg_model)
+        rembg_home = os.getenv(
+            "U2NET_HOME", os.path.join(os.path.expanduser("~"), ".u2net")
+        )
+        rembg_model_path = os.path.join(rembg_home, f"{args.rembg_model}.onnx")
+
+    model.save_bundle(
+        args.bundle_dir,
+        model_version=args.model_version
+        or f"{args.model_path}:{args.config_name}:{args.weight_name}",
+        rembg_model_path=rembg_model_path,
+    )
+    print(f"Wrote model bundle to {args.bundle_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,13 @@ from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 import numpy as np
 
+from embedding_cache import EmbeddingCache, vectorizer_namespace
+
 load_dotenv()
 
 
 class CacheServer:
-    def __init__(self):
+    def __init__(self, vectorizer=None, namespace=None):
         # Get bucket name from Pulumi stack output
         self.S3_BUCKET_NAME = os.getenv("PULUMI_BUCKET_NAME", "dreamscapeassetbucket")
         # self.REDIS_USER = os.getenv("REDIS_USER", "empty")
@@ -80,14 +82,25 @@ class CacheServer:
         # INSTANTIATE BLOB STORAGE
         self.blob_storage = boto3.client("s3")
 
-    def getEmbedding(self, objectName):
-        api_key = os.environ.get("OPENAI_API_KEY")
-        oai = OpenAITextVectorizer(
-            model="text-embedding-ada-002",
-            api_config={"api_key": api_key},
+        # INSTANTIATE EMBEDDINGS (built once, memoized across requests)
+        # vectors are stored per namespace, so an injected vectorizer (e.g. a
+        # test stub) never shares entries with the OpenAI model's
+        if vectorizer is None:
+            vectorizer = OpenAITextVectorizer(
+                model="text-embedding-ada-002",
+                api_config={"api_key": os.environ.get("OPENAI_API_KEY")},
+            )
+        self.embeddings = EmbeddingCache(
+            vectorizer,
+            os.getenv("EMBEDDING_CACHE_PATH", "output/embeddings.sqlite3"),
+            namespace=namespace or vectorizer_namespace(vectorizer),
         )
-        embedding = oai.embed(objectName)
-        return embedding
+
+    def getEmbedding(self, objectName):
+        return self.embeddings.embed(objectName)
+
+    def getEmbeddings(self, objectNames):
+        return self.embeddings.embed_many(objectNames)
 
     def get(self, embedding, objectName):
         output_dir = "output/"
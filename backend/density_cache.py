@@ -0,0 +1,147 @@
+import contextlib
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Union
+
+import numpy as np
+import torch
+
+from disk_cache import DiskLRU
+
+
+class DensityVolumeCache:
+    """
+    Persists the density volumes `TSR.extract_mesh` triangulates, so that
+    extracting a known scene again at another threshold, or with other
+    cleanup settings, only runs marching cubes.
+
+    A volume depends on nothing but the scene code, the grid resolution and
+    the weights, so entries are keyed by a hash of the scene code and the
+    model version, plus the resolution. They are stored as fp16 `.npy` files
+    (the density around any useful threshold is far from the fp16 limits)
+    and memory-mapped on load, which lets the slab path read one slab at a
+    time. A coarser level of detail whose lattice is a subsample of a cached
+    one, i.e. (R - 1) divides (R' - 1), is served by striding that volume.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        model_version: str,
+        max_bytes: int = 4 * 1024**3,
+    ):
+        self.root = Path(root)
+        self.model_version = model_version
+        self.volumes = DiskLRU(self.root, max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.lod_hits = 0
+        self.misses = 0
+        # full-volume resolutions stored per scene key, for level-of-detail
+        # lookups; evicted entries are dropped lazily
+        self._resolutions: Dict[str, Set[int]] = {}
+        self._reindex()
+
+    def _reindex(self):
+        resolutions: Dict[str, Set[int]] = {}
+        for name in self.volumes.names():
+            key, _, resolution = name[: -len(".npy")].partition("-")
+            if resolution.isdigit():
+                resolutions.setdefault(key, set()).add(int(resolution))
+        with self._lock:
+            self._resolutions = resolutions
+
+    def key(self, scene_code: torch.Tensor) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.model_version.encode("utf-8"))
+        # scene codes are stored as fp16, so hash what survives a round trip
+        digest.update(scene_code.detach().to(torch.float16).cpu().numpy().tobytes())
+        return digest.hexdigest()
+
+    def _name(self, key: str, resolution: int, variant: str = "") -> str:
+        return f"{key}-{resolution}{'-' + variant if variant else ''}.npy"
+
+    def _load(self, name: str) -> Optional[np.ndarray]:
+        path = self.volumes.get(name)
+        return np.load(path, mmap_mode="r") if path is not None else None
+
+    def _lod(self, key: str, resolution: int) -> Optional[np.ndarray]:
+        with self._lock:
+            cached = sorted(self._resolutions.get(key, ()))
+        # the smallest finer volume reads the fewest pages
+        for finer in cached:
+            stride, remainder = divmod(finer - 1, resolution - 1)
+            if stride < 2 or remainder != 0:
+                continue
+            volume = self._load(self._name(key, finer))
+            if volume is not None:
+                return volume[::stride, ::stride, ::stride]
+            with self._lock:
+                self._resolutions.get(key, set()).discard(finer)
+        return None
+
+    def get(
+        self, key: str, resolution: int, variant: str = ""
+    ) -> Optional[np.ndarray]:
+        """
+        The fp16 (R, R, R) volume stored for `key`, memory-mapped: the exact
+        one, else a strided finer one, else the `variant` one; or None.
+        """
+        volume = self._load(self._name(key, resolution))
+        lod = volume is None and resolution > 1
+        if lod:
+            volume = self._lod(key, resolution)
+        if volume is None and variant:
+            lod = False
+            volume = self._load(self._name(key, resolution, variant))
+        with self._lock:
+            if volume is None:
+                self.misses += 1
+            elif lod:
+                self.lod_hits += 1
+            else:
+                self.hits += 1
+        return volume
+
+    @contextlib.contextmanager
+    def writer(
+        self, key: str, resolution: int, variant: str = ""
+    ) -> Iterator[np.ndarray]:
+        """
+        Yields a writable fp16 (R, R, R) memmap; the volume is stored once
+        the block exits without an exception and discarded otherwise.
+        """
+        name = self._name(key, resolution, variant)
+        tmp_path = self.root / f".{name}.{uuid.uuid4().hex}.tmp"
+        volume = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float16, shape=(resolution,) * 3
+        )
+        try:
+            yield volume
+            volume.flush()
+            del volume
+            os.replace(tmp_path, self.volumes.path(name))
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self.volumes.add(name)
+        if not variant:
+            with self._lock:
+                self._resolutions.setdefault(key, set()).add(resolution)
+                stale = len(self._resolutions) > 2 * len(self.volumes) + 64
+            if stale:
+                # keys whose volumes were all evicted
+                self._reindex()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.volumes),
+                "bytes": self.volumes.total_bytes,
+                "hits": self.hits,
+                "lod_hits": self.lod_hits,
+                "misses": self.misses,
+            }
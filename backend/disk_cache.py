@@ -0,0 +1,116 @@
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+def path_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def remove_path(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class DiskLRU:
+    """
+    Size-bounded LRU over the entries (files or directories) directly under
+    `root`. Recency is persisted as the entry's mtime, so the order survives a
+    restart. Names starting with "." are never tracked, which leaves room for
+    staging areas next to the entries.
+    """
+
+    def __init__(self, root: Union[str, Path], max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+
+        entries = [p for p in self.root.iterdir() if not p.name.startswith(".")]
+        for entry in sorted(entries, key=lambda p: p.stat().st_mtime):
+            size = path_size(entry)
+            self._sizes[entry.name] = size
+            self._total += size
+        self.evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sizes
+
+    def names(self) -> List[str]:
+        """Tracked entry names, least recently used first."""
+        with self._lock:
+            return list(self._sizes)
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    def get(self, name: str) -> Optional[Path]:
+        """Return the path of entry `name` and mark it most recently used."""
+        path = self.path(name)
+        with self._lock:
+            if name not in self._sizes:
+                return None
+            if not path.exists():
+                self._total -= self._sizes.pop(name)
+                return None
+            self._sizes.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def add(self, name: str):
+        """Start tracking `name`, which must already exist under `root`."""
+        size = path_size(self.path(name))
+        with self._lock:
+            self._total -= self._sizes.pop(name, 0)
+            self._sizes[name] = size
+            self._total += size
+        self.evict(keep=name)
+
+    def discard(self, name: str):
+        with self._lock:
+            self._total -= self._sizes.pop(name, 0)
+        remove_path(self.path(name))
+
+    def evict(self, keep: Optional[str] = None):
+        victims = []
+        with self._lock:
+            for name in list(self._sizes):
+                if self._total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                self._total -= self._sizes.pop(name)
+                victims.append(name)
+        for name in victims:
+            logging.info("Evicting %s from %s", name, self.root)
+            remove_path(self.path(name))
@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+import numpy as np
+
+from asset_cache import normalize_prompt
+from batching import MicroBatcher
+
+
+def vectorizer_namespace(vectorizer: Any) -> str:
+    """
+    The namespace vectors from `vectorizer` are stored under: its `model`
+    attribute (as on redisvl vectorizers), else its class name.
+    """
+    return str(getattr(vectorizer, "model", None) or type(vectorizer).__name__)
+
+
+class EmbeddingCache:
+    """
+    Memoizes text embeddings: a bounded in-memory LRU in front of a SQLite
+    store on disk, keyed by normalized text and `namespace` (the embedding
+    model, so switching models never returns stale vectors).
+
+    Misses from concurrent callers are coalesced by a `MicroBatcher` into a
+    single `vectorizer.embed_many` call. `vectorizer` is anything with an
+    `embed_many(texts) -> List[List[float]]` method, e.g. a redisvl
+    vectorizer, `semantic_cache.LocalTextEmbedder` or a test stub.
+    """
+
+    def __init__(
+        self,
+        vectorizer: Any,
+        path: Union[str, Path],
+        namespace: str,
+        max_memory_entries: int = 4096,
+        max_batch_size: int = 64,
+        batch_window: float = 0.01,
+    ):
+        self.vectorizer = vectorizer
+        self.namespace = namespace
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "namespace TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, text))"
+        )
+        self._db.commit()
+
+        self._batcher = MicroBatcher(
+            self._embed_batch,
+            max_batch_size=max_batch_size,
+            window=batch_window,
+            name="embedding-batcher",
+        )
+
+    def embed(self, text: str) -> List[float]:
+        text = normalize_prompt(text)
+        embedding = self._lookup(text)
+        if embedding is not None:
+            return embedding
+        return self._batcher(text)
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        texts = [normalize_prompt(text) for text in texts]
+        embeddings = [self._lookup(text) for text in texts]
+        missing = [text for text, e in zip(texts, embeddings) if e is None]
+        if missing:
+            computed = dict(zip(missing, self._embed_batch(missing)))
+            embeddings = [
+                e if e is not None else computed[text]
+                for text, e in zip(texts, embeddings)
+            ]
+        return embeddings
+
+    def close(self):
+        self._batcher.close()
+        self._db.close()
+
+    def _lookup(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            if text in self._memory:
+                self._memory.move_to_end(text)
+                self.hits += 1
+                return self._memory[text]
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE namespace = ? AND text = ?",
+                (self.namespace, text),
+            ).fetchone()
+        if row is None:
+            return None
+        embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+        with self._lock:
+            self.hits += 1
+            self._remember(text, embedding)
+        return embedding
+
+    def _remember(self, text: str, embedding: List[float]):
+        self._memory[text] = embedding
+        self._memory.move_to_end(text)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # the same text may be requested by several callers in one batch
+        unique = list(dict.fromkeys(texts))
+        embeddings = dict(zip(unique, self.vectorizer.embed_many(unique)))
+        with self._lock:
+            self.misses += len(unique)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, text, vector) VALUES (?, ?, ?)",
+                [
+                    (self.namespace, text, np.asarray(e, dtype=np.float32).tobytes())
+                    for text, e in embeddings.items()
+                ],
+            )
+            self._db.commit()
+            for text, embedding in embeddings.items():
+                self._remember(text, embedding)
+        return [embeddings[text] for text in texts]
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import random
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ImageBackend:
+    """Describes how to ask one image-generation service for an image."""
+
+    def build_request(
+        self, prompt: str
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Return the (url, headers, json payload) to POST for `prompt`."""
+        raise NotImplementedError
+
+    def retry_after(self, response: httpx.Response) -> Optional[float]:
+        """Seconds the service asked us to wait before retrying, if any."""
+        value = response.headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+
+class HuggingFaceInferenceBackend(ImageBackend):
+    def __init__(
+        self,
+        api_url: str = "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-schnell",
+        token: Optional[str] = None,
+    ):
+        self.api_url = api_url
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def build_request(self, prompt):
+        return self.api_url, self.headers, {"inputs": prompt}
+
+    def retry_after(self, response):
+        # 503 while the model is loading comes with an estimate of how long
+        try:
+            estimated_time = response.json().get("estimated_time")
+        except ValueError:
+            estimated_time = None
+        if estimated_time is not None:
+            return float(estimated_time)
+        return super().retry_after(response)
+
+
+class LocalImageBackend(ImageBackend):
+    """A stand-in image server (e.g. for load tests) taking {"prompt": ...}."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def build_request(self, prompt):
+        return self.url, {}, {"prompt": prompt}
+
+
+class ImageGenerationClient:
+    """
+    Async image-generation client shared by every request.
+
+    * one pooled `httpx.AsyncClient`, so connections are kept alive
+    * at most `max_concurrency` requests in flight (the provider's quota)
+    * retries with exponential backoff and jitter on 429/5xx and transport
+      errors, honouring the provider's "model loading" estimate
+    * a hard `deadline` per image covering all retries
+
+    The client runs its own event loop on a background thread so that both
+    coroutines (`generate`) and worker threads (`generate_sync`) can use it.
+    """
+
+    def __init__(
+        self,
+        backend: ImageBackend,
+        max_concurrency: int = 4,
+        request_timeout: float = 60.0,
+        deadline: float = 120.0,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="image-client", daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=self.request_timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+
+    async def generate(self, prompt: str) -> bytes:
+        future = asyncio.run_coroutine_threadsafe(self._generate(prompt), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def generate_sync(self, prompt: str) -> bytes:
+        return asyncio.run_coroutine_threadsafe(
+            self._generate(prompt), self._loop
+        ).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _generate(self, prompt: str) -> bytes:
+        try:
+            return await asyncio.wait_for(
+                self._generate_with_retries(prompt), self.deadline
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"Image generation did not finish within {self.deadline:g}s"
+            )
+
+    async def _generate_with_retries(self, prompt: str) -> bytes:
+        url, headers, payload = self.backend.build_request(prompt)
+        for attempt in range(self.max_retries + 1):
+            wait = None
+            try:
+                # hold a quota slot only while the request is in flight
+                async with self._semaphore:
+                    response = await self._client.post(
+                        url, headers=headers, json=payload
+                    )
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("Image request failed (%s), retrying", e)
+            else:
+                if response.status_code == 200:
+                    return response.content
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or attempt == self.max_retries
+                ):
+                    raise RuntimeError(
+                        f"Image generation failed with {response.status_code}: {response.text[:200]}"
+                    )
+                wait = self.backend.retry_after(response)
+                logging.warning(
+                    "Image request returned %d, retrying", response.status_code
+                )
+
+            if wait is None:
+                wait = self.backoff * 2**attempt
+            wait = min(wait, self.max_backoff) * random.uniform(0.8, 1.2)
+            await asyncio.sleep(wait)
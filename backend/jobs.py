@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    object_name: str
+    params: Dict[str, Any]
+    key: Optional[str] = None
+    waiters: int = 1
+    status: JobStatus = JobStatus.PENDING
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "object_name": self.object_name,
+            "params": self.params,
+            "waiters": self.waiters,
+            "status": self.status.value,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs generation jobs on an in-process worker pool so that the event loop
+    stays free to answer polls and cache hits while a job is in flight.
+
+    `handler(object_name, **params)` is called on a worker thread and its
+    return value becomes the job result.
+
+    If `key_fn(object_name, params)` is given, submissions are single-flight:
+    while a job with the same key is in flight, further submissions return
+    that job instead of starting a new one, and every waiter sees the
+    leader's result or failure. The key is released once the job finishes so
+    that a failed job can be retried.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Any],
+        max_workers: int = 1,
+        max_finished_jobs: int = 1024,
+        key_fn: Optional[Callable[[str, Dict[str, Any]], str]] = None,
+    ):
+        self.handler = handler
+        self.key_fn = key_fn
+        self.max_finished_jobs = max_finished_jobs
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="generation"
+        )
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._inflight: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, object_name: str, **params) -> Job:
+        key = self.key_fn(object_name, params) if self.key_fn is not None else None
+        with self._lock:
+            if key is not None and key in self._inflight:
+                leader = self._inflight[key]
+                leader.waiters += 1
+                logging.info(
+                    "Coalesced %s onto in-flight job %s", object_name, leader.id
+                )
+                return leader
+            job = Job(
+                id=uuid.uuid4().hex, object_name=object_name, params=params, key=key
+            )
+            self._jobs[job.id] = job
+            if key is not None:
+                self._inflight[key] = job
+            self._prune()
+            # submit under the lock so followers never see a job without a future
+            job.future = self.executor.submit(self._run, job)
+        return job
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for `job` without blocking the event loop and return its result.
+
+        Raises `asyncio.TimeoutError` if the job does not finish within
+        `timeout` seconds. The job itself keeps running for other waiters.
+        """
+        # shield so that a timed out or disconnected waiter cannot cancel a
+        # job that is still queued for everyone else
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(job.future)), timeout
+        )
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+    def _run(self, job: Job) -> Any:
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = self.handler(job.object_name, **job.params)
+            job.status = JobStatus.SUCCEEDED
+            return job.result
+        except Exception as e:
+            logging.error("Job %s (%s) failed: %s", job.id, job.object_name, str(e))
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+            raise
+        finally:
+            job.finished_at = time.time()
+            if job.key is not None:
+                with self._lock:
+                    if self._inflight.get(job.key) is job:
+                        del self._inflight[job.key]
+
+    def _prune(self):
+        # drop the oldest finished jobs once we hold more than max_finished_jobs
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
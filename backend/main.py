@@ -1,26 +1,44 @@
 # main.py
-# from cache_utils import CacheServer
 from io import BytesIO
+import asyncio
 import random
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, List
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel
 import torch
 import numpy as np
-import requests
 from PIL import Image
-import rembg
 import xatlas
 import uvicorn
 import io
 from PIL import Image
 
 from tsr.system import TSR
-from tsr.utils import remove_background, resize_foreground, save_video
-from tsr.bake_texture import bake_texture
+from tsr.models.transformer.attention import SlicedAttnProcessor
+from tsr.utils import save_video
+from tsr.bake_texture import bake_texture as bake_texture_atlas
+from asset_cache import AssetCache
+from background_removal import BackgroundRemover
+from batching import MicroBatcher
+from density_cache import DensityVolumeCache
+from image_client import (
+    HuggingFaceInferenceBackend,
+    ImageGenerationClient,
+    LocalImageBackend,
+)
+from jobs import JobManager, JobStatus
+from memo_cache import MemoCache, image_digest
+from worker_pool import InferenceWorkerPool, ensure_bundle
+from scene_store import SceneCodeStore
+from semantic_cache import LocalCacheServer
+from pipeline import Pipeline, Stage
 from dotenv import load_dotenv
 import boto3
 
@@ -34,8 +52,38 @@ logging.basicConfig(
 app = FastAPI(title="3D Model Generation API")
 
 API_URL = "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-schnell"
-headers = {"Authorization": f"Bearer {os.getenv('FLUX_API2')}"}
-# CACHE_SERVER = CacheServer()
+
+
+def make_image_client():
+    # IMAGE_BACKEND_URL points at a local stand-in image server for load tests
+    if os.getenv("IMAGE_BACKEND_URL"):
+        backend = LocalImageBackend(os.getenv("IMAGE_BACKEND_URL"))
+    else:
+        backend = HuggingFaceInferenceBackend(API_URL, os.getenv("FLUX_API2"))
+    return ImageGenerationClient(
+        backend,
+        # keep at or below the inference provider's concurrency quota
+        max_concurrency=int(os.getenv("FLUX_MAX_CONCURRENCY", 4)),
+        deadline=float(os.getenv("FLUX_DEADLINE_S", 120)),
+    )
+
+
+IMAGE_CLIENT = make_image_client()
+
+
+def make_cache_server():
+    # "local" runs fully in-process, "redis" needs Redis + OpenAI embeddings
+    backend = os.getenv("SEMANTIC_CACHE", "").lower()
+    if backend == "local":
+        return LocalCacheServer()
+    if backend == "redis":
+        from cache_utils import CacheServer
+
+        return CacheServer()
+    return None
+
+
+CACHE_SERVER = make_cache_server()
 
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "dreamscapeassetbucket")
 BLOB_STORAGE = boto3.client("s3")
@@ -45,8 +93,7 @@ def query(keyword):
     payload = {
         "inputs": f"a {keyword} against a plain gray background presented at slight angle to make it look like a 3d asset",
     }
-    response = requests.post(API_URL, headers=headers, json=payload)
-    return response.content
+    return IMAGE_CLIENT.generate_sync(payload["inputs"])
 
 
 def generate_image(keyword):
@@ -60,54 +107,342 @@ class ModelService:
     def __init__(
         self,
         device: str = "cuda:0",
-        model_path: str = "stabilityai/TripoSR",
+        # a hub repo, a local checkout or an offline bundle (see
+        # build_model_bundle.py)
+        model_path: str = os.getenv("TSR_MODEL_PATH", "stabilityai/TripoSR"),
+        config_name: str = "config.yaml",
+        weight_name: str = "model.ckpt",
         chunk_size: int = 8192,
         output_dir: str = "output/",
+        max_batch_size: int = int(os.getenv("TSR_MAX_BATCH_SIZE", 4)),
+        batch_window_ms: float = float(os.getenv("TSR_BATCH_WINDOW_MS", 50)),
+        precision: str = os.getenv("TSR_PRECISION", "fp32"),
+        compile: bool = os.getenv("TSR_COMPILE", "0") == "1",
+        compile_mode: str = os.getenv("TSR_COMPILE_MODE", "default"),
+        quantize: bool = os.getenv("TSR_QUANTIZE", "0") == "1",
+        fuse_projections: bool = os.getenv("TSR_FUSE_PROJECTIONS", "0") == "1",
+        attention_memory_mb: float = float(os.getenv("TSR_ATTENTION_MEMORY_MB", 0)),
+        online_softmax: bool = os.getenv("TSR_ATTENTION_ONLINE_SOFTMAX", "0") == "1",
+        inference_workers: int = int(os.getenv("TSR_INFERENCE_WORKERS", 0)),
+        threads_per_worker: int = int(os.getenv("TSR_THREADS_PER_WORKER", 1)),
+        pin_workers: bool = os.getenv("TSR_PIN_WORKERS", "1") == "1",
+        # bounds every wait on a worker, on top of restarting dead ones
+        worker_timeout_s: float = float(os.getenv("TSR_WORKER_TIMEOUT_S", 600)),
+        # coarse-to-fine density evaluation for marching cubes (0 = dense)
+        mc_coarse_block_size: int = int(os.getenv("TSR_MC_COARSE_BLOCK", 0)),
+        mc_refine_margin: float = float(os.getenv("TSR_MC_REFINE_MARGIN", 5.0)),
+        # slab-wise streaming extraction, bounds memory at high resolutions
+        mc_slab_size: int = int(os.getenv("TSR_MC_SLAB_SIZE", 0)),
+        # parallel block-wise marching cubes on CPU
+        mc_workers: int = int(os.getenv("TSR_MC_WORKERS", 1)),
+        mc_block_size: int = int(os.getenv("TSR_MC_BLOCK_SIZE", 64)),
+        mc_executor: str = os.getenv("TSR_MC_EXECUTOR", "process"),
+        rembg_model: str = os.getenv("REMBG_MODEL", "u2net"),
+        rembg_sessions: int = int(os.getenv("REMBG_SESSIONS", 1)),
+        rembg_intra_op_threads: int = int(os.getenv("REMBG_INTRA_OP_THREADS", 1)),
+        rembg_inter_op_threads: int = int(os.getenv("REMBG_INTER_OP_THREADS", 1)),
+        rembg_max_batch_size: int = int(os.getenv("REMBG_MAX_BATCH_SIZE", 4)),
+        rembg_batch_window_ms: float = float(os.getenv("REMBG_BATCH_WINDOW_MS", 10)),
+        # fast mode: compute the mask at this size and upsample it (0 = off)
+        rembg_mask_size: int = int(os.getenv("REMBG_MASK_SIZE", 0)),
     ):
+        startup_start = time.perf_counter()
+        self.startup_timings = {}
         self.device = "cpu" if not torch.cuda.is_available() else device
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
 
-        # Initialize model
+        def timed(name, fn, *args, **kwargs):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.startup_timings[name] = time.perf_counter() - start
+            return result
+
+        self.worker_pool = None
+        if inference_workers > 0:
+            # workers and this process all mmap one bundle, sharing weights
+            model_path = timed(
+                "bundle_s",
+                ensure_bundle,
+                model_path,
+                self.output_dir / "bundles",
+                config_name,
+                weight_name,
+            )
+        bundle = TSR.read_bundle_manifest(model_path)
+        if bundle is not None and "rembg" in bundle:
+            # rembg looks for its model here before downloading it
+            os.environ["U2NET_HOME"] = os.path.join(model_path, bundle["rembg"])
+
+        # Initialize model, and the rembg sessions alongside it
         logging.info("Initializing model...")
-        self.model = TSR.from_pretrained(
-            model_path, config_name="config.yaml", weight_name="model.ckpt"
+        if quantize and self.device != "cpu":
+            logging.warning("int8 quantization is CPU only, loading fp32 weights")
+            quantize = False
+        if quantize and fuse_projections:
+            logging.warning("int8 models keep separate projections, not fusing them")
+            fuse_projections = False
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            rembg_future = pool.submit(
+                timed,
+                "rembg_load_s",
+                BackgroundRemover,
+                rembg_model,
+                num_sessions=rembg_sessions,
+                intra_op_threads=rembg_intra_op_threads,
+                inter_op_threads=rembg_inter_op_threads,
+                max_batch_size=rembg_max_batch_size,
+                window=rembg_batch_window_ms / 1000.0,
+                mask_size=rembg_mask_size or None,
+            )
+            self.model = timed(
+                "tsr_load_s",
+                TSR.from_pretrained,
+                model_path,
+                config_name=config_name,
+                weight_name=weight_name,
+                quantize=quantize,
+                quantized_cache_dir=str(self.output_dir / "quantized"),
+                fuse_projections=fuse_projections,
+            )
+            self.background_remover = rembg_future.result()
+        # identifies the weights in cache keys; override when redeploying
+        # changed weights under the same path
+        self.model_version = os.getenv(
+            "MODEL_VERSION",
+            bundle["model_version"]
+            if bundle is not None
+            else f"{model_path}:{config_name}:{weight_name}",
         )
+        if quantize:
+            self.model_version = f"{self.model_version}:int8"
+        # fp32, or bf16/fp16 autocast; reduced precision changes the meshes
+        # slightly, so it must not share cache entries with fp32
+        self.model.set_precision(precision, self.device)
+        if precision != "fp32":
+            self.model_version = f"{self.model_version}:{precision}"
         self.model.renderer.set_chunk_size(chunk_size)
-        self.model.to(self.device)
+        timed("to_device_s", self.model.to, self.device)
+        if fuse_projections:
+            # one GEMM + split per attention instead of two or three; a no-op
+            # unless .to() copied the views apart from the fused weights
+            self.model.fuse_projections()
+        if attention_memory_mb > 0:
+            # bounds the attention score buffers when several requests
+            # share a CPU worker
+            self.model.backbone.set_attn_processor(
+                SlicedAttnProcessor(attention_memory_mb, online_softmax=online_softmax)
+            )
+        self.compiled = compile
+        if compile:
+            self.model.enable_compile(mode=compile_mode)
+        self.max_batch_size = max_batch_size
+        self.model.set_marching_cubes_workers(mc_workers, mc_block_size, mc_executor)
+        self.mesh_options = {
+            "coarse_block_size": mc_coarse_block_size,
+            "refine_margin": mc_refine_margin,
+            "slab_size": mc_slab_size,
+        }
+        # slab and block-wise extraction give the same mesh, the interpolated
+        # regions of coarse-to-fine extraction do not; cached assets must
+        # tell the modes apart
+        self.asset_mesh_options = (
+            {
+                "coarse_block_size": mc_coarse_block_size,
+                "refine_margin": mc_refine_margin,
+            }
+            if mc_coarse_block_size > 0
+            else {}
+        )
+
+        if inference_workers > 0:
+            self.worker_pool = timed(
+                "workers_s",
+                InferenceWorkerPool,
+                model_path,
+                inference_workers,
+                threads_per_worker=threads_per_worker,
+                pin_cpus=pin_workers,
+                task_timeout=worker_timeout_s or None,
+                precision=precision,
+                chunk_size=chunk_size,
+                # workers must produce what model_version says
+                quantize=quantize,
+                quantized_cache_dir=str(self.output_dir / "quantized"),
+                fuse_projections=fuse_projections,
+                attention_memory_mb=attention_memory_mb,
+                online_softmax=online_softmax,
+                compile=compile,
+                compile_mode=compile_mode,
+                warmup_batch_size=max_batch_size,
+                mc_workers=mc_workers,
+                mc_block_size=mc_block_size,
+                mc_executor=mc_executor,
+            )
+
+        # Requests arriving within batch_window_ms share one TSR forward pass;
+        # with a worker pool every worker gets a batch of its own
+        self.reconstructor = MicroBatcher(
+            self.reconstruct_batch,
+            max_batch_size=max_batch_size,
+            window=batch_window_ms / 1000.0,
+            name="tsr-batcher",
+            concurrency=max(1, inference_workers),
+        )
+
+        # triplanes are kept so re-meshing never reruns the backbone
+        self.scene_store = SceneCodeStore(
+            self.output_dir / "scene_codes",
+            self.model_version,
+            int(os.getenv("SCENE_STORE_MAX_BYTES", 2 * 1024**3)),
+        )
+        # density volumes, so re-extracting a scene at another threshold or
+        # a coarser resolution only runs marching cubes; workers have their
+        # own processes and always evaluate the density
+        self.density_cache = DensityVolumeCache(
+            self.output_dir / "density",
+            self.model_version,
+            int(os.getenv("DENSITY_CACHE_MAX_BYTES", 4 * 1024**3)),
+        )
+        # matted/composited images and image tokens, so retries and
+        # parameter sweeps skip rembg and DINO
+        self.memo = MemoCache(
+            self.output_dir / "memo",
+            int(os.getenv("MEMO_CACHE_MEMORY_BYTES", 256 * 1024**2)),
+            int(os.getenv("MEMO_CACHE_DISK_BYTES", 4 * 1024**3)),
+        )
+
+        self.startup_timings["total_s"] = time.perf_counter() - startup_start
+        logging.info(
+            "Model service initialized successfully (%s)",
+            ", ".join(f"{k}={v:.2f}" for k, v in self.startup_timings.items()),
+        )
 
-        # Initialize rembg session
-        self.rembg_session = rembg.new_session()
-        logging.info("Model service initialized successfully")
+    def reconstruct_batch(self, images: List[Image.Image]) -> List[torch.Tensor]:
+        if self.worker_pool is not None:
+            return self.worker_pool.reconstruct(images)
+        keys = [
+            self.memo.key(
+                "image_tokens",
+                self.model_version,
+                self.model.cfg.cond_image_size,
+                image_digest(image),
+            )
+            for image in images
+        ]
+        tokens = [self.memo.get(key) for key in keys]
+        missing = [i for i, t in enumerate(tokens) if t is None]
+        with torch.no_grad():
+            if missing:
+                encoded = self.model.encode_image(
+                    [images[i] for i in missing], device=self.device
+                )
+                for i, image_tokens in zip(missing, encoded):
+                    tokens[i] = image_tokens.float()
+                    self.memo.put(keys[i], tokens[i])
+            scene_codes = self.model.forward_tokens(
+                torch.stack([t.to(self.device) for t in tokens])
+            )
+        return list(scene_codes)
+
+    def warmup(self, mc_resolution: int = 256):
+        """
+        Run every batch size the batcher can form, plus a mesh extraction,
+        once on a dummy image so compiled graphs are built before the first
+        request arrives. Lattice decoder graphs depend on the grid size, so
+        warm up at the resolution most requests use.
+        """
+        logging.info("Warming up model...")
+        start = time.perf_counter()
+        image = Image.new("RGB", (512, 512), (127, 127, 127))
+        for batch_size in range(1, self.max_batch_size + 1):
+            scene_codes = torch.stack(self.reconstruct_batch([image] * batch_size))
+        with torch.no_grad():
+            self.model.extract_mesh(
+                scene_codes[:1],
+                has_vertex_color=False,
+                resolution=mc_resolution,
+                **self.mesh_options,
+            )
+        self.startup_timings["warmup_s"] = time.perf_counter() - start
+        logging.info(f"Warmup finished in {self.startup_timings['warmup_s']:.1f}s")
 
-    async def process_image(
+    def preprocess(
         self,
         image: Image.Image,
-        object_name: str,
         foreground_ratio: float = 0.85,
+        remove_bg: bool = True,
+    ) -> Image.Image:
+        if remove_bg:
+            source = image_digest(image)
+            size = self.model.cfg.cond_image_size
+            composited_key = self.memo.key(
+                "composited",
+                source,
+                foreground_ratio,
+                size,
+                self.background_remover.model_name,
+                self.background_remover.mask_size,
+            )
+            composited = self.memo.get(composited_key)
+            if composited is not None:
+                return composited
+
+            matted_key = self.memo.key(
+                "matted",
+                source,
+                self.background_remover.model_name,
+                self.background_remover.mask_size,
+            )
+            matted = self.memo.get(matted_key)
+            if matted is None:
+                # batched with the other preprocess workers' images
+                matted = self.background_remover(image)
+                self.memo.put(matted_key, matted)
+
+            # crop, pad, composite onto gray and resize to the conditioning
+            # size in one pass; the tokenizer then only converts to float
+            composited = self.model.image_processor.composite_foreground(
+                [matted.convert("RGBA")], size, foreground_ratio
+            )[0]
+            image = Image.fromarray(composited.mul(255.0).round_().byte().numpy())
+            self.memo.put(composited_key, image)
+        return image
+
+    def reconstruct(
+        self, image: Image.Image, alias: Optional[str] = None
+    ) -> torch.Tensor:
+        key = self.scene_store.key(image)
+        scene_code = self.scene_store.get(key, self.device)
+        if scene_code is None:
+            # batched with whatever other requests arrive in the same window
+            scene_code = self.reconstructor(image)
+            self.scene_store.put(key, scene_code)
+        if alias is not None:
+            self.scene_store.alias(alias, key)
+        return scene_code[None]
+
+    def load_scene_codes(self, alias: str) -> Optional[torch.Tensor]:
+        """Scene codes previously reconstructed under `alias`, if still stored."""
+        key = self.scene_store.resolve(alias)
+        if key is None:
+            return None
+        scene_code = self.scene_store.get(key, self.device)
+        return scene_code[None] if scene_code is not None else None
+
+    def export_mesh(
+        self,
+        scene_codes: torch.Tensor,
+        job_dir: Path,
         mc_resolution: int = 256,
+        mc_threshold: float = 25.0,
         bake_texture: bool = False,
         texture_resolution: int = 0,
         render_video: bool = False,
         model_format: str = "obj",
-        remove_bg: bool = True,
     ) -> dict:
-        # Create output directory for this job
-        job_dir = self.output_dir / object_name
-        job_dir.mkdir(exist_ok=True)
-
-        # Process image
-        if remove_bg:
-            image = remove_background(image, self.rembg_session)
-            image = resize_foreground(image, foreground_ratio)
-            image = np.array(image).astype(np.float32) / 255.0
-            image = image[:, :, :3] * image[:, :, 3:4] + (1 - image[:, :, 3:4]) * 0.5
-            image = Image.fromarray((image * 255.0).astype(np.uint8))
-            image.save(job_dir / f"{object_name}.png")
-
-        # Generate 3D model
-        with torch.no_grad():
-            scene_codes = self.model([image], device=self.device)
+        job_dir = Path(job_dir)
+        job_dir.mkdir(parents=True, exist_ok=True)
 
         # Render video if requested
         if render_video:
@@ -119,15 +454,29 @@ class ModelService:
             save_video(render_images[0], job_dir / "render.mp4", fps=30)
 
         # Extract mesh
-        meshes = self.model.extract_mesh(
-            scene_codes, bake_texture, resolution=mc_resolution
-        )
+        if self.worker_pool is not None:
+            meshes = self.worker_pool.extract_mesh(
+                scene_codes,
+                bake_texture,
+                resolution=mc_resolution,
+                threshold=mc_threshold,
+                **self.mesh_options,
+            )
+        else:
+            meshes = self.model.extract_mesh(
+                scene_codes,
+                bake_texture,
+                resolution=mc_resolution,
+                threshold=mc_threshold,
+                density_cache=self.density_cache,
+                **self.mesh_options,
+            )
 
         # Save mesh and texture
-        mesh_path = job_dir / f"temp_{object_name}.{model_format}"
+        mesh_path = job_dir / f"mesh.{model_format}"
         if bake_texture:
-            texture_path = job_dir / f"{object_name}.png"
-            bake_output = bake_texture(
+            texture_path = job_dir / "texture.png"
+            bake_output = bake_texture_atlas(
                 meshes[0], self.model, scene_codes[0], texture_resolution
             )
 
@@ -155,15 +504,362 @@ class ModelService:
                 "render_path": str(job_dir / "render.mp4") if render_video else None,
             }
 
+    def process_image(
+        self,
+        image: Image.Image,
+        object_name: str,
+        foreground_ratio: float = 0.85,
+        mc_resolution: int = 256,
+        mc_threshold: float = 25.0,
+        bake_texture: bool = False,
+        texture_resolution: int = 0,
+        render_video: bool = False,
+        model_format: str = "obj",
+        remove_bg: bool = True,
+    ) -> dict:
+        job_dir = self.output_dir / object_name
+        job_dir.mkdir(exist_ok=True)
+        image = self.preprocess(image, foreground_ratio, remove_bg)
+        if remove_bg:
+            image.save(job_dir / f"{object_name}.png")
+        scene_codes = self.reconstruct(image)
+        return self.export_mesh(
+            scene_codes,
+            job_dir,
+            mc_resolution,
+            mc_threshold,
+            bake_texture,
+            texture_resolution,
+            render_video,
+            model_format,
+        )
+
 
 # Initialize model service at startup
 model_service = None
+asset_cache = None
+pipeline = None
+job_manager = None
+
+
+GENERATION_TIMEOUT_S = float(os.getenv("GENERATION_TIMEOUT_S", 600))
+
+
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", 10 * 1024**3))
+
+
+def semantic_lookup(object_name: str, params: dict) -> Optional[str]:
+    """Find an asset generated for a similar prompt with the same parameters."""
+    embedding = CACHE_SERVER.getEmbedding(object_name)
+
+    def accept(url):
+        return asset_cache.accepts(url, params)
+
+    if isinstance(CACHE_SERVER, LocalCacheServer):
+        cacheRes = CACHE_SERVER.get(embedding, object_name, accept=accept)
+    else:
+        cacheRes = CACHE_SERVER.get(embedding, object_name)
+        cacheRes = cacheRes if cacheRes and accept(cacheRes) else False
+    return cacheRes or None
+
+
+def generation_key(object_name: str, params: dict) -> str:
+    # identical requests share both the cache entry and the in-flight job;
+    # the video is not part of the asset, but a job started without it
+    # cannot serve a request that asks for one
+    key = asset_cache.key(object_name, params)
+    return f"{key}:video" if params.get("render_video") else key
+
+
+@dataclass
+class GenerationTask:
+    """State handed from one pipeline stage to the next for a single asset."""
+
+    object_name: str
+    foreground_ratio: float = 0.85
+    mc_resolution: int = 256
+    mc_threshold: float = 25.0
+    bake_texture: bool = False
+    texture_resolution: int = 0
+    render_video: bool = False
+    model_format: str = "obj"
+    remove_bg: bool = True
+    cache_key: Optional[str] = None
+    scene_alias: Optional[str] = None
+    work_dir: Optional[Path] = None
+    image: Optional[Image.Image] = None
+    scene_codes: Optional[torch.Tensor] = None
+    mesh_path: Optional[str] = None
+    obj_file_path: Optional[str] = None
+
+    @property
+    def params(self) -> dict:
+        return {
+            "foreground_ratio": self.foreground_ratio,
+            "mc_resolution": self.mc_resolution,
+            "mc_threshold": self.mc_threshold,
+            "bake_texture": self.bake_texture,
+            "texture_resolution": self.texture_resolution,
+            "render_video": self.render_video,
+            "model_format": self.model_format,
+            "remove_bg": self.remove_bg,
+        }
+
+
+def image_stage(task: GenerationTask) -> GenerationTask:
+    if task.scene_codes is not None:
+        return task
+
+    # Read and convert image
+    image_bytes = query(task.object_name)
+    if not image_bytes:
+        raise RuntimeError("Failed to generate image from keyword")
+
+    task.image = Image.open(BytesIO(image_bytes))
+    task.image.load()
+
+    task.image.save(task.work_dir / "input.png", format="PNG")
+    return task
+
+
+def preprocess_stage(task: GenerationTask) -> GenerationTask:
+    if task.scene_codes is not None:
+        return task
+    task.image = model_service.preprocess(
+        task.image, task.foreground_ratio, task.remove_bg
+    )
+    if task.remove_bg:
+        task.image.save(task.work_dir / "conditioning.png")
+    return task
+
+
+def reconstruct_stage(task: GenerationTask) -> GenerationTask:
+    if task.scene_codes is not None:
+        return task
+    task.scene_codes = model_service.reconstruct(task.image, task.scene_alias)
+    task.image = None
+    return task
+
+
+def mesh_stage(task: GenerationTask) -> GenerationTask:
+    result = model_service.export_mesh(
+        task.scene_codes,
+        task.work_dir,
+        task.mc_resolution,
+        task.mc_threshold,
+        task.bake_texture,
+        task.texture_resolution,
+        task.render_video,
+        task.model_format,
+    )
+    task.scene_codes = None
+    task.mesh_path = result["mesh_path"]
+    logging.info("3D model generated!!!")
+    return task
+
+
+def postprocess_stage(task: GenerationTask) -> GenerationTask:
+    import pymeshlab
+
+    ms = pymeshlab.MeshSet()
+    ms.load_new_mesh(task.mesh_path)
+    ms.meshing_decimation_quadric_edge_collapse(targetfacenum=8000)
+    ms.save_current_mesh(str(task.work_dir / AssetCache.ASSET_NAME))
+
+    logging.info("3d model smoothened!!!")
+
+    # the entry only becomes visible to lookups once it is complete
+    obj_file_path = str(
+        asset_cache.publish(
+            task.cache_key,
+            task.work_dir,
+            {
+                "object_name": task.object_name,
+                "params": task.params,
+                "scene_alias": task.scene_alias,
+            },
+        )
+    )
+
+    with open(obj_file_path, "rb") as f:
+        try:
+            BLOB_STORAGE.upload_fileobj(f, S3_BUCKET_NAME, obj_file_path)
+            print("Uploaded file to S3.")
+        except Exception as e:
+            print(f"Error uploading file to S3: {e}")
+    if CACHE_SERVER is not None:
+        try:
+            CACHE_SERVER.post(
+                obj_file_path, CACHE_SERVER.getEmbedding(task.object_name)
+            )
+        except Exception as e:
+            print(f"Error adding {task.object_name} to the semantic cache: {e}")
+
+    task.obj_file_path = obj_file_path
+    return task
+
+
+def stage_workers(name: str, default: int) -> int:
+    return int(os.getenv(f"PIPELINE_{name.upper()}_WORKERS", default))
+
+
+def build_pipeline() -> Pipeline:
+    queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", 8))
+    return Pipeline(
+        [
+            # network-bound FLUX calls
+            Stage("image", image_stage, stage_workers("image", 4), queue_size),
+            # rembg + foreground cropping on CPU, enough workers to fill a
+            # matting batch on every session
+            Stage(
+                "preprocess",
+                preprocess_stage,
+                stage_workers(
+                    "preprocess",
+                    model_service.background_remover.batcher.max_batch_size
+                    * model_service.background_remover.num_sessions,
+                ),
+                queue_size,
+            ),
+            # enough workers to fill a batch in the TSR micro-batcher
+            Stage(
+                "reconstruct",
+                reconstruct_stage,
+                stage_workers(
+                    "reconstruct",
+                    model_service.reconstructor.max_batch_size
+                    * model_service.reconstructor.concurrency,
+                ),
+                queue_size,
+            ),
+            # marching cubes / texture baking, one per inference worker
+            Stage(
+                "mesh",
+                mesh_stage,
+                stage_workers("mesh", model_service.reconstructor.concurrency),
+                queue_size,
+            ),
+            # pymeshlab decimation + S3 upload
+            Stage(
+                "postprocess",
+                postprocess_stage,
+                stage_workers("postprocess", 2),
+                queue_size,
+            ),
+        ]
+    )
+
+
+def generate_asset(object_name: str, **params) -> str:
+    """Run the full keyword -> image -> mesh -> S3 chain and return the .obj path."""
+    task = GenerationTask(object_name, **params)
+    task.cache_key = asset_cache.key(object_name, task.params)
+    cached_path = asset_cache.lookup(task.cache_key)
+    if cached_path is not None:
+        return str(cached_path)
+    # the triplane only depends on the prompt and preprocessing, so a new
+    # resolution / texture / video for a known prompt skips straight to meshing
+    task.scene_alias = asset_cache.key(
+        object_name,
+        {"foreground_ratio": task.foreground_ratio, "remove_bg": task.remove_bg},
+    )
+    task.scene_codes = model_service.load_scene_codes(task.scene_alias)
+    task.work_dir = asset_cache.staging_dir(task.cache_key)
+    try:
+        task = pipeline.submit(task).result()
+    except Exception:
+        asset_cache.discard_staging(task.work_dir)
+        raise
+    return task.obj_file_path
+
+
+class GenerateRequest(BaseModel):
+    object_name: str
+    foreground_ratio: float = 0.85
+    mc_resolution: int = 256
+    mc_threshold: float = 25.0
+    bake_texture: bool = False
+    texture_resolution: int = 0
+    render_video: bool = False
+    model_format: str = "obj"
+    remove_bg: bool = True
 
 
 @app.on_event("startup")
 async def startup_event():
-    global model_service
+    global model_service, asset_cache, pipeline, job_manager
     model_service = ModelService()
+    if model_service.compiled:
+        # the first user must not pay for graph compilation
+        model_service.warmup()
+    asset_cache = AssetCache(
+        "output/assets",
+        model_service.model_version,
+        ASSET_CACHE_MAX_BYTES,
+        mesh_options=model_service.asset_mesh_options,
+    )
+    pipeline = build_pipeline()
+    job_manager = JobManager(
+        generate_asset,
+        # bounds the number of jobs admitted into the pipeline at once
+        max_workers=int(os.getenv("GENERATION_WORKERS", 16)),
+        key_fn=generation_key,
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if job_manager is not None:
+        job_manager.shutdown(wait=False)
+    if model_service is not None:
+        model_service.background_remover.close()
+        if model_service.worker_pool is not None:
+            model_service.worker_pool.close()
+
+
+@app.get("/pipeline/stats")
+async def get_pipeline_stats():
+    return {
+        "inflight_jobs": job_manager.inflight(),
+        "stages": pipeline.stats(),
+        "startup": model_service.startup_timings,
+        "memo_cache": model_service.memo.stats(),
+        "density_cache": model_service.density_cache.stats(),
+        "background_removal": model_service.background_remover.stats(),
+        "workers": (
+            model_service.worker_pool.stats()
+            if model_service.worker_pool is not None
+            else None
+        ),
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: GenerateRequest):
+    params = request.dict()
+    object_name = params.pop("object_name")
+    job = job_manager.submit(object_name, **params)
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}")
+    return FileResponse(job.result, filename=f"{job.object_name}.obj")
 
 
 @app.get("/generate/{object_name}")
@@ -171,94 +867,50 @@ async def generate_model(
     object_name: str,
     foreground_ratio: float = 0.85,
     mc_resolution: int = 256,
+    mc_threshold: float = 25.0,
     bake_texture: bool = False,
     texture_resolution: int = 0,
     render_video: bool = False,
     model_format: str = "obj",
     remove_bg: bool = True,
 ):
-    # embedding = CACHE_SERVER.getEmbedding(object_name)
-    # print("--------------EMBEDDING--------------")
-    # print(embedding)
-
-    # cacheRes = CACHE_SERVER.get(embedding, object_name)
-    # print("--------------CACHERES--------------")
-    # print(cacheRes)
-
-    # if cacheRes:
-    #     return FileResponse(cacheRes, media_type="application/octet-stream")
-    output_dir = "output/"
-    object_dir = os.path.join(output_dir, object_name)
-
-    # Check if folder with the object name exists
-    if os.path.isdir(object_dir):
-        return FileResponse(
-            f"{object_dir}/{object_name}.obj",
-            filename=f"{object_name}.obj",
-        )
+    params = {
+        "foreground_ratio": foreground_ratio,
+        "mc_resolution": mc_resolution,
+        "mc_threshold": mc_threshold,
+        "bake_texture": bake_texture,
+        "texture_resolution": texture_resolution,
+        "model_format": model_format,
+        "remove_bg": remove_bg,
+    }
+    cached_path = asset_cache.lookup(asset_cache.key(object_name, params))
+    if cached_path is not None:
+        return FileResponse(cached_path, filename=f"{object_name}.obj")
+
+    if CACHE_SERVER is not None:
+        # embedding may be a model forward pass or a network call
+        cacheRes = await asyncio.to_thread(semantic_lookup, object_name, params)
+        if cacheRes:
+            logging.info("Semantic cache hit for %s: %s", object_name, cacheRes)
+            return FileResponse(cacheRes, filename=f"{object_name}.obj")
+
+    # Thin wrapper around the job API: submit and wait without blocking the loop
+    job = job_manager.submit(object_name, render_video=render_video, **params)
     try:
-        # Read and convert image
-        image_bytes = query(object_name)
-        if not image_bytes:
-            raise HTTPException(
-                status_code=500, detail="Failed to generate image from keyword"
-            )
-
-        pil_image = Image.open(BytesIO(image_bytes))
-
-        os.makedirs(f"output/{object_name}", exist_ok=True)
-        temp_image_path = f"output/{object_name}/{object_name}.png"
-        pil_image.save(temp_image_path, format="PNG")
-
-        # Process image and generate model
-        result = await model_service.process_image(
-            pil_image,
-            object_name,
-            foreground_ratio,
-            mc_resolution,
-            bake_texture,
-            texture_resolution,
-            render_video,
-            model_format,
-            remove_bg,
+        obj_file_path = await job_manager.wait(job, timeout=GENERATION_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504, detail=f"Generation of {object_name} timed out"
         )
-
-        logging.info("3D model generated!!!")
-
-        import pymeshlab
-
-        temp_obj_file_path = result["mesh_path"]
-        obj_file_path = f"{object_dir}/{object_name}.obj"
-        ms = pymeshlab.MeshSet()
-        ms.load_new_mesh(temp_obj_file_path)
-        ms.meshing_decimation_quadric_edge_collapse(targetfacenum=8000)
-        ms.save_current_mesh(obj_file_path)
-
-        logging.info("3d model smoothened!!!")
-
-        with open(obj_file_path, "rb") as f:
-            try:
-                BLOB_STORAGE.upload_fileobj(f, S3_BUCKET_NAME, obj_file_path)
-
-            except Exception as e:
-                print(f"Error uploading file to S3: {e}")
-                return None
-
-        url = (
-            f"https://dreamscapeassetbucket.s3.us-west-1.amazonaws.com/{obj_file_path}"
-        )
-        print("Uploaded file to S3.")
-        # url = CACHE_SERVER.post(result["mesh_path"], embedding)
-
-        return FileResponse(
-            obj_file_path,
-            filename=f"{object_name}.obj",
-        )
-
     except Exception as e:
         logging.error("Error during model generation: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+    return FileResponse(
+        obj_file_path,
+        filename=f"{job.object_name}.obj",
+    )
+
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
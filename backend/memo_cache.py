@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from disk_cache import DiskLRU
+
+
+def image_digest(image: Image.Image) -> str:
+    """Content hash of a decoded image (pixels, mode and size)."""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def value_nbytes(value: Any) -> int:
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    raise TypeError(f"Cannot memoize values of type {type(value).__name__}")
+
+
+class MemoCache:
+    """
+    Memoizes intermediate results of the generation pipeline (matted and
+    composited images, image-tokenizer features) under a key derived from
+    the input content and the stage parameters.
+
+    Recently used values are kept in memory up to `max_memory_bytes`; every
+    value is also written to disk (images as PNG, tensors as `.npy`) where a
+    `DiskLRU` bounds it to `max_disk_bytes`, so entries evicted from memory
+    or lost to a restart are still a file read away.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_memory_bytes: int = 256 * 1024**2,
+        max_disk_bytes: int = 4 * 1024**3,
+    ):
+        self.root = Path(root)
+        self.max_memory_bytes = max_memory_bytes
+        self.disk = DiskLRU(self.root, max_disk_bytes)
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(stage: str, *parts: Any) -> str:
+        blob = json.dumps([stage, *parts], sort_keys=True, default=str)
+        return f"{stage}-{hashlib.sha256(blob.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        value = None
+        path = self.disk.get(f"{key}.png")
+        if path is not None:
+            with Image.open(path) as image:
+                image.load()
+                value = image.copy()
+        else:
+            path = self.disk.get(f"{key}.npy")
+            if path is not None:
+                value = torch.from_numpy(np.load(path))
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: Any):
+        if isinstance(value, Image.Image):
+            name = f"{key}.png"
+            write = lambda f: value.save(f, format="PNG")
+        else:
+            name = f"{key}.npy"
+            array = value.detach().cpu().numpy()
+            write = lambda f: np.save(f, array)
+
+        tmp_path = self.root / f".{name}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, self.disk.path(name))
+        self.disk.add(name)
+
+        with self._lock:
+            self._remember(key, value)
+
+    def _remember(self, key: str, value: Any):
+        if key in self._memory:
+            self.memory_bytes -= value_nbytes(self._memory.pop(key))
+        nbytes = value_nbytes(value)
+        if nbytes > self.max_memory_bytes:
+            return
+        self._memory[key] = value
+        self.memory_bytes += nbytes
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= value_nbytes(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk.total_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
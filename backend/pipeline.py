@@ -0,0 +1,145 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Stage:
+    """
+    One step of a `Pipeline`: `fn(item)` runs on `workers` threads that pull
+    from a bounded input queue of `queue_size` items. A full queue blocks the
+    upstream stage, so a slow stage applies backpressure instead of letting
+    work pile up in memory.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        queue_size: int = 8,
+    ):
+        assert workers >= 1, "workers must be a positive integer."
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+        self._lock = threading.Lock()
+        self._started_at: Optional[float] = None
+        self._busy = 0
+        self._busy_time = 0.0
+        self._processed = 0
+        self._failed = 0
+        self._stopped = 0
+
+    def run(self, item: Any) -> Any:
+        with self._lock:
+            self._busy += 1
+        start = time.perf_counter()
+        try:
+            return self.fn(item)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._busy -= 1
+                self._busy_time += elapsed
+                self._processed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = (
+                time.perf_counter() - self._started_at if self._started_at else 0.0
+            )
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "busy_workers": self._busy,
+                "processed": self._processed,
+                "failed": self._failed,
+                # fraction of worker-time spent inside fn since the stage started
+                "utilization": (
+                    self._busy_time / (uptime * self.workers) if uptime > 0 else 0.0
+                ),
+                "mean_latency_s": (
+                    self._busy_time / self._processed if self._processed else 0.0
+                ),
+            }
+
+
+class Pipeline:
+    """
+    Chains `Stage`s with bounded queues so that different items can occupy
+    different stages at the same time. `submit(item)` returns a future that
+    resolves to the output of the last stage, or to the first exception any
+    stage raised for that item.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        assert len(stages) > 0, "a pipeline needs at least one stage."
+        self.stages = stages
+        self._threads: List[threading.Thread] = []
+        for index, stage in enumerate(stages):
+            stage._started_at = time.perf_counter()
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"{stage.name}-{i}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self.stages[0].queue.put((item, future))
+        return future
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def close(self):
+        # one sentinel per worker of the first stage; each stage forwards its
+        # own sentinels downstream once its workers have drained
+        for _ in range(self.stages[0].workers):
+            self.stages[0].queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            entry = stage.queue.get()
+            if entry is None:
+                if next_stage is not None:
+                    self._forward_shutdown(index)
+                return
+            item, future = entry
+            try:
+                item = stage.run(item)
+            except Exception as e:
+                logging.error("Pipeline stage %s failed: %s", stage.name, str(e))
+                future.set_exception(e)
+                continue
+            if next_stage is None:
+                future.set_result(item)
+            else:
+                next_stage.queue.put((item, future))
+
+    def _forward_shutdown(self, index: int):
+        stage = self.stages[index]
+        with stage._lock:
+            stage._stopped += 1
+            last = stage._stopped == stage.workers
+        if last:
+            for _ in range(self.stages[index + 1].workers):
+                self.stages[index + 1].queue.put(None)
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from disk_cache import DiskLRU
+
+
+class SceneCodeStore:
+    """
+    Persists TSR scene codes (the triplanes returned by `TSR.forward`) so
+    that re-meshing at another resolution, baking a texture or rendering a
+    video never has to rerun the image tokenizer and backbone.
+
+    Codes are keyed by a hash of the preprocessed conditioning image and the
+    model version and stored as fp16 `.npy` files, which are memory-mapped
+    on load. An alias can additionally map a request-level key (prompt plus
+    preprocessing parameters) to a code, since regenerating the image for
+    the same prompt would otherwise produce a different image hash.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        model_version: str,
+        max_bytes: int = 2 * 1024**3,
+    ):
+        self.root = Path(root)
+        self.model_version = model_version
+        self.codes = DiskLRU(self.root, max_bytes)
+        self.alias_root = self.root / ".aliases"
+        self.alias_root.mkdir(parents=True, exist_ok=True)
+
+    def key(self, image: Image.Image) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.model_version.encode("utf-8"))
+        digest.update(f"{image.mode}:{image.size}".encode("utf-8"))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _name(self, key: str) -> str:
+        return f"{key}.npy"
+
+    def get(self, key: str, device: str = "cpu") -> Optional[torch.Tensor]:
+        """Load the scene code stored under `key` as float32, or None."""
+        path = self.codes.get(self._name(key))
+        if path is None:
+            return None
+        scene_code = np.load(path, mmap_mode="r")
+        return torch.from_numpy(np.asarray(scene_code, dtype=np.float32)).to(device)
+
+    def put(self, key: str, scene_code: torch.Tensor):
+        name = self._name(key)
+        tmp_path = self.root / f".{name}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, scene_code.detach().to(torch.float16).cpu().numpy())
+        os.replace(tmp_path, self.codes.path(name))
+        self.codes.add(name)
+
+    def alias(self, alias: str, key: str):
+        tmp_path = self.alias_root / f".{alias}.{uuid.uuid4().hex}.tmp"
+        tmp_path.write_text(key)
+        os.replace(tmp_path, self.alias_root / alias)
+
+    def resolve(self, alias: str) -> Optional[str]:
+        path = self.alias_root / alias
+        if not path.is_file():
+            return None
+        key = path.read_text().strip()
+        return key if self._name(key) in self.codes else None
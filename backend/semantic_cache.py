@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_cache import EmbeddingCache
+
+load_dotenv()
+
+
+class LocalTextEmbedder:
+    """Sentence embeddings from a local sentence-transformers model."""
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        device: str = "cpu",
+    ):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "LocalTextEmbedder requires sentence-transformers, to use it, please install sentence-transformers."
+            )
+        self.model = SentenceTransformer(model_name, device=device)
+
+    @property
+    def dims(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(
+            texts, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return embeddings.astype(np.float32).tolist()
+
+
+class VectorIndex:
+    """
+    Exact top-k cosine index over unit-normalized vectors stored in a
+    memory-mapped file, so the index survives restarts and does not have to
+    fit in the Python heap.
+
+    With `dtype="int8"` each vector is stored symmetric-quantized with its own
+    float32 scale, which cuts memory and bandwidth by 4x at a small recall
+    cost.
+    """
+
+    CHUNK_ROWS = 16384
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        dims: int,
+        dtype: str = "float32",
+        initial_capacity: int = 1024,
+    ):
+        assert dtype in ["float32", "int8"], "dtype must be float32 or int8."
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.path / "index.json"
+
+        count = 0
+        capacity = initial_capacity
+        if self.meta_path.is_file():
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta["dims"] != dims or meta["dtype"] != dtype:
+                raise ValueError(
+                    f"index at {self.path} was built with dims={meta['dims']}, dtype={meta['dtype']}"
+                )
+            count, capacity = meta["count"], meta["capacity"]
+
+        self.dims = dims
+        self.dtype = dtype
+        self.count = count
+        self._open(capacity)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _open(self, capacity: int):
+        self.capacity = capacity
+        self.vectors = self._map(
+            "vectors.bin", np.dtype(self.dtype), (capacity, self.dims)
+        )
+        self.scales = (
+            self._map("scales.bin", np.dtype(np.float32), (capacity,))
+            if self.dtype == "int8"
+            else None
+        )
+
+    def _map(self, name: str, dtype: np.dtype, shape: Tuple[int, ...]) -> np.memmap:
+        file_path = self.path / name
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        with open(file_path, "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=shape)
+
+    def _write_meta(self):
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "dims": self.dims,
+                    "dtype": self.dtype,
+                    "count": self.count,
+                    "capacity": self.capacity,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.meta_path)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Append one vector or a (N, dims) batch; returns the new row ids."""
+        vectors = self._normalize(np.atleast_2d(vectors))
+        assert vectors.shape[1] == self.dims, f"expected {self.dims}-d vectors"
+        n = vectors.shape[0]
+        if self.count + n > self.capacity:
+            self.vectors.flush()
+            capacity = self.capacity
+            while capacity < self.count + n:
+                capacity *= 2
+            self._open(capacity)
+
+        rows = np.arange(self.count, self.count + n)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales = np.maximum(scales, 1e-12)
+            self.vectors[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.scales[rows] = scales
+            self.scales.flush()
+        else:
+            self.vectors[rows] = vectors
+        self.vectors.flush()
+        self.count += n
+        self._write_meta()
+        return rows
+
+    def search(self, query: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the cosine similarities and row ids of the `k` nearest rows."""
+        if self.count == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        query = self._normalize(query).reshape(-1)
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, self.CHUNK_ROWS):
+            end = min(start + self.CHUNK_ROWS, self.count)
+            chunk = self.vectors[start:end]
+            if self.dtype == "int8":
+                # numpy has no int8 GEMV; dequantizing a chunk for BLAS is
+                # much faster than letting the matmul upcast element-wise
+                scores[start:end] = (
+                    chunk.astype(np.float32) @ query
+                ) * self.scales[start:end]
+            else:
+                scores[start:end] = chunk @ query
+        k = min(k, self.count)
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return scores[rows], rows
+
+
+class LocalCacheServer:
+    """
+    Drop-in replacement for `cache_utils.CacheServer` that needs neither Redis
+    nor OpenAI: prompts are embedded with a local model and matched against a
+    memory-mapped `VectorIndex`. A lookup hits when the best match is at
+    least `threshold` cosine-similar, so "crimson chair" can reuse a cached
+    "red chair".
+    """
+
+    def __init__(
+        self,
+        index_dir: str = os.getenv("SEMANTIC_CACHE_DIR", "output/semantic_cache"),
+        model_name: str = os.getenv(
+            "SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+        ),
+        dtype: str = os.getenv("SEMANTIC_CACHE_DTYPE", "float32"),
+        threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.85)),
+        top_k: int = 8,
+        embedder: Optional[Any] = None,
+    ):
+        self.embedder = (
+            embedder if embedder is not None else LocalTextEmbedder(model_name)
+        )
+        self.threshold = threshold
+        self.top_k = top_k
+        self.index = VectorIndex(index_dir, self.embedder.dims, dtype=dtype)
+        self.embeddings = EmbeddingCache(
+            self.embedder,
+            Path(index_dir) / "embeddings.sqlite3",
+            namespace=model_name,
+        )
+
+        self.payload_path = Path(index_dir) / "payloads.jsonl"
+        self.payloads: List[dict] = []
+        if self.payload_path.is_file():
+            with open(self.payload_path) as f:
+                self.payloads = [json.loads(line) for line in f]
+        # a crash between the index and payload writes leaves rows without a
+        # payload; pad them so later rows stay aligned, they never match
+        self._append_payloads(
+            [{"url": None}] * (len(self.index) - len(self.payloads))
+        )
+        self._lock = threading.Lock()
+
+    def _append_payloads(self, payloads: List[dict]):
+        if not payloads:
+            return
+        self.payloads.extend(payloads)
+        with open(self.payload_path, "a") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload) + "\n")
+
+    def getEmbedding(self, objectName):
+        return self.embeddings.embed(objectName)
+
+    def getEmbeddings(self, objectNames):
+        return self.embeddings.embed_many(objectNames)
+
+    def get(
+        self,
+        embedding,
+        objectName,
+        accept: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Return the url of the closest cached object above the threshold, or
+        False. `accept(url)` can reject candidates, e.g. assets generated
+        with different parameters; the next best candidate is tried then.
+        """
+        with self._lock:
+            scores, rows = self.index.search(np.asarray(embedding), self.top_k)
+            for score, row in zip(scores, rows):
+                if score < self.threshold:
+                    break
+                url = self.payloads[row]["url"]
+                if url is not None and (accept is None or accept(url)):
+                    return url
+        return False
+
+    def post(self, obj_file_path, embedding):
+        with self._lock:
+            self.index.add(np.asarray(embedding))
+            self._append_payloads([{"url": obj_file_path}])
+        return obj_file_path
@@ -1,10 +1,135 @@
-from typing import Callable, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
 
 import numpy as np
 import torch
+import torch.multiprocessing
 import torch.nn as nn
 from torchmcubes import marching_cubes
 
+# block-wise marching cubes pools, shared by every helper in the process
+_executors: Dict[Tuple[str, int], Executor] = {}
+
+
+def block_executor(kind: str, num_workers: int) -> Executor:
+    """
+    A process pool, or a thread pool for marching cubes implementations
+    that release the GIL, created on first use and kept for the process.
+    """
+    key = (kind, num_workers)
+    if key not in _executors:
+        if kind == "thread":
+            _executors[key] = ThreadPoolExecutor(
+                num_workers, thread_name_prefix="marching-cubes"
+            )
+        elif kind == "process":
+            # fork is unsafe once torch has started its thread pools
+            _executors[key] = ProcessPoolExecutor(
+                num_workers, mp_context=torch.multiprocessing.get_context("spawn")
+            )
+        else:
+            raise ValueError(f"Unknown executor: {kind}")
+    return _executors[key]
+
+
+def triangulate_block(block: torch.FloatTensor) -> Tuple[torch.FloatTensor, torch.LongTensor]:
+    v_pos, t_pos_idx = marching_cubes(block.contiguous(), 0.0)
+    return v_pos[..., [2, 1, 0]], t_pos_idx.long()
+
+
+def coarse_lattice(resolution: int, block_size: int) -> torch.LongTensor:
+    """Fine-grid indices of the coarse lattice: every `block_size`-th vertex plus the last."""
+    indices = torch.arange(0, resolution, block_size)
+    if indices[-1] != resolution - 1:
+        indices = torch.cat([indices, torch.tensor([resolution - 1])])
+    return indices
+
+
+def lattice_cells(
+    indices: torch.LongTensor, resolution: int
+) -> Tuple[torch.LongTensor, torch.LongTensor, torch.FloatTensor]:
+    """
+    For every fine vertex along one axis: the first and last coarse cell it
+    belongs to (they differ on coarse vertices shared by two cells) and its
+    interpolation weight inside the first one.
+    """
+    fine = torch.arange(resolution)
+    cell = (torch.searchsorted(indices, fine, right=True) - 1).clamp(
+        max=len(indices) - 2
+    )
+    start, end = indices[cell], indices[cell + 1]
+    weight = (fine - start).float() / (end - start).float()
+    first = torch.where((fine == start) & (cell > 0), cell - 1, cell)
+    return first, cell, weight
+
+
+def upsample_lattice(
+    values: torch.FloatTensor, indices: torch.LongTensor, resolution: int
+) -> torch.FloatTensor:
+    """Trilinear interpolation of a coarse-lattice volume onto the full grid."""
+    _, cell, weight = lattice_cells(indices, resolution)
+    cell, weight = cell.to(values.device), weight.to(values.device)
+    for dim in range(3):
+        shape = [1, 1, 1]
+        shape[dim] = -1
+        low = values.index_select(dim, cell)
+        values = low.lerp_(values.index_select(dim, cell + 1), weight.view(shape))
+    return values
+
+
+def straddling_cells(
+    values: torch.FloatTensor, level: float, margin: float
+) -> torch.BoolTensor:
+    """Cells of a lattice volume whose corner range comes within `margin` of `level`."""
+    nx, ny, nz = (n - 1 for n in values.shape)
+    corners = torch.stack(
+        [
+            values[i : nx + i, j : ny + j, k : nz + k]
+            for i in (0, 1)
+            for j in (0, 1)
+            for k in (0, 1)
+        ]
+    )
+    low, high = corners.amin(dim=0), corners.amax(dim=0)
+    return (low - margin <= level) & (high + margin >= level)
+
+
+def merge_vertices(
+    v_pos: torch.FloatTensor,
+    t_pos_idx: torch.LongTensor,
+    candidates: Optional[torch.BoolTensor] = None,
+    decimals: int = 4,
+) -> Tuple[torch.FloatTensor, torch.LongTensor]:
+    """
+    Merge the `candidates` vertices (all by default) that coincide once
+    rounded to `decimals` in grid index units, e.g. the copies of a seam
+    vertex produced by two neighbouring slabs or blocks, re-index the faces
+    and drop the ones that became degenerate.
+    """
+    indices = (
+        torch.arange(len(v_pos))
+        if candidates is None
+        else candidates.nonzero()[:, 0]
+    )
+    if len(indices) == 0:
+        return v_pos, t_pos_idx
+    keys = torch.round(v_pos[indices].double() * 10**decimals).long()
+    _, inverse = torch.unique(keys, dim=0, return_inverse=True)
+    # every group of copies is represented by its first vertex
+    first = torch.full((int(inverse.max()) + 1,), len(v_pos)).scatter_reduce_(
+        0, inverse, indices, "amin"
+    )
+    remap = torch.arange(len(v_pos))
+    remap[indices] = first[inverse]
+    keep = remap == torch.arange(len(v_pos))
+    t_pos_idx = (torch.cumsum(keep, 0) - 1)[remap[t_pos_idx]]
+    degenerate = (
+        (t_pos_idx[:, 0] == t_pos_idx[:, 1])
+        | (t_pos_idx[:, 1] == t_pos_idx[:, 2])
+        | (t_pos_idx[:, 0] == t_pos_idx[:, 2])
+    )
+    return v_pos[keep], t_pos_idx[~degenerate]
+
 
 class IsosurfaceHelper(nn.Module):
     points_range: Tuple[float, float] = (0, 1)
@@ -15,11 +140,25 @@ class IsosurfaceHelper(nn.Module):
 
 
 class MarchingCubeHelper(IsosurfaceHelper):
-    def __init__(self, resolution: int) -> None:
+    # set once torchmcubes turned out to be built without CUDA
+    cuda_unsupported: bool = False
+
+    def __init__(
+        self,
+        resolution: int,
+        num_workers: int = 1,
+        block_size: int = 64,
+        executor: str = "process",
+    ) -> None:
         super().__init__()
         self.resolution = resolution
         self.mc_func: Callable = marching_cubes
         self._grid_vertices: Optional[torch.FloatTensor] = None
+        # CPU marching cubes is single-threaded; with num_workers > 1 the
+        # volume is split into blocks triangulated in parallel
+        self.num_workers = num_workers
+        self.block_size = block_size
+        self.executor = executor
 
     @property
     def grid_vertices(self) -> torch.FloatTensor:
@@ -37,16 +176,100 @@ class MarchingCubeHelper(IsosurfaceHelper):
             self._grid_vertices = verts
         return self._grid_vertices
 
+    def triangulate(
+        self, volume: torch.FloatTensor
+    ) -> Tuple[torch.FloatTensor, torch.LongTensor]:
+        """The zero level set of `volume`, vertices in (dim0, dim1, dim2) index units."""
+        volume = volume.detach()
+        if volume.device.type != "cpu":
+            if not MarchingCubeHelper.cuda_unsupported:
+                try:
+                    v_pos, t_pos_idx = self.mc_func(volume, 0.0)
+                    return v_pos[..., [2, 1, 0]], t_pos_idx
+                except AttributeError:
+                    MarchingCubeHelper.cuda_unsupported = True
+                    print("torchmcubes was not compiled with CUDA support, use CPU version instead.")
+            volume = volume.cpu()
+        if self.num_workers > 1:
+            return self.triangulate_blocks(volume)
+        v_pos, t_pos_idx = self.mc_func(volume, 0.0)
+        return v_pos[..., [2, 1, 0]], t_pos_idx
+
+    def triangulate_blocks(
+        self, volume: torch.FloatTensor
+    ) -> Tuple[torch.FloatTensor, torch.LongTensor]:
+        """
+        `triangulate` on CPU in blocks of `block_size` cells that share
+        their boundary vertices, `num_workers` at a time; the seam copies of
+        surface vertices are merged, so the result stays watertight.
+        """
+        pool = block_executor(self.executor, self.num_workers)
+        if self.executor == "process":
+            # workers map the volume instead of receiving a copy of each block
+            volume = volume.share_memory_()
+        starts = [list(range(0, n - 1, self.block_size)) for n in volume.shape]
+        blocks = []
+        for x0 in starts[0]:
+            for y0 in starts[1]:
+                for z0 in starts[2]:
+                    block = volume[
+                        x0 : x0 + self.block_size + 1,
+                        y0 : y0 + self.block_size + 1,
+                        z0 : z0 + self.block_size + 1,
+                    ]
+                    # no sign change, no surface
+                    if block.min() > 0 or block.max() < 0:
+                        continue
+                    blocks.append(((x0, y0, z0), pool.submit(triangulate_block, block)))
+
+        vertices, faces, num_vertices = [], [], 0
+        for offset, future in blocks:
+            v_pos, t_pos_idx = future.result()
+            vertices.append(v_pos + torch.tensor(offset, dtype=v_pos.dtype))
+            faces.append(t_pos_idx + num_vertices)
+            num_vertices += len(v_pos)
+        if not vertices:
+            return torch.zeros(0, 3), torch.zeros(0, 3, dtype=torch.long)
+        v_pos = torch.cat(vertices)
+        on_seam = torch.zeros(len(v_pos), dtype=torch.bool)
+        for dim, dim_starts in enumerate(starts):
+            seams = torch.tensor(dim_starts[1:], dtype=v_pos.dtype)
+            on_seam |= torch.isin(v_pos[:, dim], seams)
+        return merge_vertices(v_pos, torch.cat(faces), on_seam)
+
     def forward(
         self,
         level: torch.FloatTensor,
     ) -> Tuple[torch.FloatTensor, torch.LongTensor]:
         level = -level.view(self.resolution, self.resolution, self.resolution)
-        try:
-            v_pos, t_pos_idx = self.mc_func(level.detach(), 0.0)
-        except AttributeError:
-            print("torchmcubes was not compiled with CUDA support, use CPU version instead.")
-            v_pos, t_pos_idx = self.mc_func(level.detach().cpu(), 0.0)
-        v_pos = v_pos[..., [2, 1, 0]]
+        v_pos, t_pos_idx = self.triangulate(level)
         v_pos = v_pos / (self.resolution - 1.0)
         return v_pos.to(level.device), t_pos_idx.to(level.device)
+
+    def forward_slabs(
+        self,
+        slab_fn: Callable[[int, int], torch.FloatTensor],
+        slab_size: int,
+    ) -> Tuple[torch.FloatTensor, torch.LongTensor]:
+        """
+        Marching cubes over the grid in slabs of `slab_size` cells along the
+        first axis, so only one slab of the field exists at a time.
+        `slab_fn(start, stop)` returns the field (surface at 0) on vertex
+        rows [start, stop). Consecutive slabs share a row of vertices; the
+        copies of the surface vertices on it are merged. Returns CPU tensors.
+        """
+        vertices, faces, num_vertices = [], [], 0
+        for start in range(0, self.resolution - 1, slab_size):
+            stop = min(start + slab_size, self.resolution - 1) + 1
+            v_pos, t_pos_idx = self.triangulate(slab_fn(start, stop))
+            v_pos, t_pos_idx = v_pos.cpu(), t_pos_idx.cpu().long()
+            v_pos[:, 0] += start
+            vertices.append(v_pos)
+            faces.append(t_pos_idx + num_vertices)
+            num_vertices += len(v_pos)
+        v_pos = torch.cat(vertices)
+        seams = torch.arange(slab_size, self.resolution - 1, slab_size)
+        v_pos, t_pos_idx = merge_vertices(
+            v_pos, torch.cat(faces), torch.isin(v_pos[:, 0], seams.float())
+        )
+        return v_pos / (self.resolution - 1.0), t_pos_idx
@@ -1,12 +1,14 @@
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Tuple, Union
 
 import torch
+import torch.nn as nn
 import torch.nn.functional as F
 from einops import rearrange, reduce
 
 from ..utils import (
     BaseModule,
+    CompiledFunction,
     chunk_batch,
     get_activation,
     rays_intersect_bbox,
@@ -31,6 +33,9 @@ class TriplaneNeRFRenderer(BaseModule):
     def configure(self) -> None:
         assert self.cfg.feature_reduction in ["concat", "mean"]
         self.chunk_size = 0
+        self.decode_chunk = self._decode_chunk
+        self.decode_lattice_chunk = self._decode_lattice_chunk
+        self.pad_chunks = False
 
     def set_chunk_size(self, chunk_size: int):
         assert (
@@ -38,6 +43,48 @@ class TriplaneNeRFRenderer(BaseModule):
         ), "chunk_size must be a non-negative integer (0 for no chunking)."
         self.chunk_size = chunk_size
 
+    def enable_compile(self, **compile_kwargs):
+        """
+        Compile the per-chunk feature reduction + decoder, for point queries
+        and for lattice queries. The last chunk is padded to a full chunk so
+        every call reuses the same graph (per lattice size).
+        `F.grid_sample` stays eager: inductor's CPU lowering of it is several
+        times slower than the native kernel.
+        """
+        self.decode_chunk = CompiledFunction(self._decode_chunk, **compile_kwargs)
+        self.decode_lattice_chunk = CompiledFunction(
+            self._decode_lattice_chunk, **compile_kwargs
+        )
+        self.pad_chunks = True
+
+    def _query_chunk(
+        self, decoder: torch.nn.Module, triplane: torch.Tensor, x: torch.Tensor
+    ) -> Dict[str, torch.Tensor]:
+        indices2D: torch.Tensor = torch.stack(
+            (x[..., [0, 1]], x[..., [0, 2]], x[..., [1, 2]]),
+            dim=-3,
+        )
+        out: torch.Tensor = F.grid_sample(
+            rearrange(triplane, "Np Cp Hp Wp -> Np Cp Hp Wp", Np=3),
+            rearrange(indices2D, "Np N Nd -> Np () N Nd", Np=3),
+            align_corners=False,
+            mode="bilinear",
+        )
+        return self.decode_chunk(decoder, out)
+
+    def _decode_chunk(
+        self, decoder: torch.nn.Module, out: torch.Tensor
+    ) -> Dict[str, torch.Tensor]:
+        if self.cfg.feature_reduction == "concat":
+            out = rearrange(out, "Np Cp () N -> N (Np Cp)", Np=3)
+        elif self.cfg.feature_reduction == "mean":
+            out = reduce(out, "Np Cp () N -> N Cp", Np=3, reduction="mean")
+        else:
+            raise NotImplementedError
+
+        net_out: Dict[str, torch.Tensor] = decoder(out)
+        return net_out
+
     def query_triplane(
         self,
         decoder: torch.nn.Module,
@@ -54,41 +101,162 @@ class TriplaneNeRFRenderer(BaseModule):
         )
 
         def _query_chunk(x):
-            indices2D: torch.Tensor = torch.stack(
-                (x[..., [0, 1]], x[..., [0, 2]], x[..., [1, 2]]),
-                dim=-3,
-            )
-            out: torch.Tensor = F.grid_sample(
-                rearrange(triplane, "Np Cp Hp Wp -> Np Cp Hp Wp", Np=3),
-                rearrange(indices2D, "Np N Nd -> Np () N Nd", Np=3),
-                align_corners=False,
-                mode="bilinear",
-            )
-            if self.cfg.feature_reduction == "concat":
-                out = rearrange(out, "Np Cp () N -> N (Np Cp)", Np=3)
-            elif self.cfg.feature_reduction == "mean":
-                out = reduce(out, "Np Cp () N -> N Cp", Np=3, reduction="mean")
-            else:
-                raise NotImplementedError
-
-            net_out: Dict[str, torch.Tensor] = decoder(out)
-            return net_out
+            return self._query_chunk(decoder, triplane, x)
 
         if self.chunk_size > 0:
+            n_positions = positions.shape[0]
+            if self.pad_chunks and n_positions % self.chunk_size != 0:
+                positions = F.pad(
+                    positions, (0, 0, 0, self.chunk_size - n_positions % self.chunk_size)
+                )
             net_out = chunk_batch(_query_chunk, self.chunk_size, positions)
+            net_out = {k: v[:n_positions] for k, v in net_out.items()}
         else:
             net_out = _query_chunk(positions)
 
+        net_out = self.activate(net_out)
+        net_out = {k: v.view(*input_shape, -1) for k, v in net_out.items()}
+
+        return net_out
+
+    def activate(self, net_out: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        # the decoder may run under autocast; activations such as exp-based
+        # densities are evaluated in fp32
+        net_out = {k: v.float() for k, v in net_out.items()}
         net_out["density_act"] = get_activation(self.cfg.density_activation)(
             net_out["density"] + self.cfg.density_bias
         )
         net_out["color"] = get_activation(self.cfg.color_activation)(
             net_out["features"]
         )
+        return net_out
 
-        net_out = {k: v.view(*input_shape, -1) for k, v in net_out.items()}
+    def query_lattice(
+        self,
+        decoder: torch.nn.Module,
+        axis: Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor, torch.Tensor]],
+        triplane: torch.Tensor,
+    ) -> Dict[str, torch.Tensor]:
+        """
+        `query_triplane` on an axis-aligned lattice (positions in
+        (-radius, radius)), flattened in "ij" meshgrid order. `axis` is
+        either one axis used for x, y and z, or an (x, y, z) tuple, e.g. to
+        evaluate one slab of a grid.
 
-        return net_out
+        Every plane is only seen at the lattice's 2D projection, so each is
+        sampled once there and the per-point features are assembled by
+        broadcasting. When the decoder is a `NeRFMLP` with a plain first
+        `nn.Linear`, that layer is folded into three per-plane projections,
+        so the 3 * Cp-wide input is never materialized either.
+        """
+        if isinstance(axis, torch.Tensor):
+            axis = (axis, axis, axis)
+        x, y, z = (
+            scale_tensor(a, (-self.cfg.radius, self.cfg.radius), (-1, 1)).to(
+                triplane.dtype
+            )
+            for a in axis
+        )
+
+        # plane 0 is indexed by (x, y), plane 1 by (x, z) and plane 2 by (y, z)
+        def sample(plane, u, v):
+            u, v = torch.meshgrid(u, v, indexing="ij")
+            lattice = torch.stack((u, v), dim=-1)
+            features = F.grid_sample(
+                plane[None], lattice[None], align_corners=False, mode="bilinear"
+            )
+            return features[0].permute(1, 2, 0)  # U V Cp
+
+        if len(x) == len(y) == len(z) and torch.equal(x, y) and torch.equal(y, z):
+            # one (u, v) lattice serves all three planes
+            features = sample(triplane.flatten(0, 1), x, x)
+            features = features.view(len(x), len(x), 3, -1).unbind(dim=2)
+        else:
+            features = (
+                sample(triplane[0], x, y),
+                sample(triplane[1], x, z),
+                sample(triplane[2], y, z),
+            )
+        if self.cfg.feature_reduction == "mean":
+            features = [f / 3.0 for f in features]
+
+        layers = getattr(decoder, "layers", None)
+        fold = (
+            isinstance(layers, nn.Sequential)
+            and type(layers[0]) is nn.Linear
+            and hasattr(decoder, "split_output")
+        )
+        if fold:
+            first = layers[0]
+            num_channels = features[0].shape[-1]
+            weights = (
+                first.weight.split(num_channels, dim=1)
+                if self.cfg.feature_reduction == "concat"
+                else [first.weight] * 3
+            )
+            # U V n_neurons per plane, the bias folded into the first plane
+            features = [
+                F.linear(f, w.to(f.dtype)) for f, w in zip(features, weights)
+            ]
+            if first.bias is not None:
+                features[0] += first.bias.to(features[0].dtype)
+
+        # (x, y) rows per chunk, each covering every z
+        nx, ny, nz = len(x), len(y), len(z)
+        rows = min(max(1, self.chunk_size // nz), ny) if self.chunk_size > 0 else ny
+        if self.pad_chunks and ny % rows != 0:
+            # every chunk the same shape, for the compiled decoder
+            pad = rows - ny % rows
+            features = [
+                F.pad(features[0], (0, 0, 0, pad)),
+                features[1],
+                F.pad(features[2], (0, 0, 0, 0, 0, pad)),
+            ]
+        outputs = None
+        for i in range(nx):
+            for j in range(0, ny, rows):
+                out = self.decode_lattice_chunk(
+                    decoder,
+                    features[0][i, j : j + rows, None],
+                    features[1][i, None],
+                    features[2][j : j + rows],
+                    fold,
+                )
+                if outputs is None:
+                    outputs = {
+                        k: o.new_empty(nx * ny * nz, o.shape[-1])
+                        for k, o in out.items()
+                    }
+                start = (i * ny + j) * nz
+                count = min(rows, ny - j) * nz
+                for k, o in out.items():
+                    outputs[k][start : start + count] = o[:count]
+
+        return self.activate(outputs)
+
+    def _decode_lattice_chunk(
+        self,
+        decoder: torch.nn.Module,
+        xy: torch.Tensor,
+        xz: torch.Tensor,
+        yz: torch.Tensor,
+        fold: bool,
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Decoder outputs on rows x columns of lattice points from their
+        broadcastable per-plane features (Y 1 C, 1 Z C and Y Z C). With
+        `fold` the features are already the first layer's projections.
+        """
+        if fold:
+            return decoder.split_output(decoder.layers[1:](xy + xz + yz).flatten(0, 1))
+        if self.cfg.feature_reduction == "concat":
+            shape = (yz.shape[0], yz.shape[1], -1)
+            return decoder(
+                torch.cat((xy.expand(shape), xz.expand(shape), yz), dim=-1).flatten(
+                    0, 1
+                )
+            )
+        return decoder((xy + xz + yz).flatten(0, 1))
 
     def _forward(
         self,
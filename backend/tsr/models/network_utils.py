@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Optional
 
 import torch
 import torch.nn as nn
@@ -119,6 +119,10 @@ class NeRFMLP(BaseModule):
 
         features = self.layers(x)
         features = features.reshape(*inp_shape, -1)
-        out = {"density": features[..., 0:1], "features": features[..., 1:4]}
+        out = self.split_output(features)
 
         return out
+
+    def split_output(self, features: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """Named outputs from the last layer's activations."""
+        return {"density": features[..., 0:1], "features": features[..., 1:4]}
@@ -1,3 +1,4 @@
+import os
 from dataclasses import dataclass
 
 import torch
@@ -18,18 +19,29 @@ class DINOSingleImageTokenizer(BaseModule):
     cfg: Config
 
     def configure(self) -> None:
-        self.model: ViTModel = ViTModel(
-            ViTModel.config_class.from_pretrained(
-                hf_hub_download(
-                    repo_id=self.cfg.pretrained_model_name_or_path,
-                    filename="config.json",
-                )
+        # a local directory (e.g. inside an offline model bundle) avoids the
+        # hub round-trip for the ViT config
+        if os.path.isdir(self.cfg.pretrained_model_name_or_path):
+            config_path = os.path.join(
+                self.cfg.pretrained_model_name_or_path, "config.json"
+            )
+        else:
+            config_path = hf_hub_download(
+                repo_id=self.cfg.pretrained_model_name_or_path,
+                filename="config.json",
             )
+        self.model: ViTModel = ViTModel(
+            ViTModel.config_class.from_pretrained(config_path)
         )
 
         if self.cfg.enable_gradient_checkpointing:
             self.model.encoder.gradient_checkpointing = True
 
+        self.reset_non_persistent_buffers()
+
+    def reset_non_persistent_buffers(self) -> None:
+        # not part of the state dict, so they must be rebuilt when the module
+        # was created on the meta device
         self.register_buffer(
             "image_mean",
             torch.as_tensor([0.485, 0.456, 0.406]).reshape(1, 1, 3, 1, 1),
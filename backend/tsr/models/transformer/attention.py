@@ -36,7 +36,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from typing import Optional
+from typing import Optional, Tuple
 
 import torch
 import torch.nn.functional as F
@@ -448,37 +448,101 @@ class Attention(nn.Module):
 
     @torch.no_grad()
     def fuse_projections(self, fuse=True):
+        """
+        Build a single `to_kv` (and, for self-attention, `to_qkv`) projection
+        so the processors run one GEMM plus a split instead of two or three
+        skinny ones. `to_q`, `to_k` and `to_v` are re-pointed at slices of the
+        fused weights, so no parameter memory is duplicated and loading a
+        state dict afterwards updates both views. Fusing again is a no-op
+        while the views still share the fused weights, e.g. after loading a
+        fused state dict with `assign=True`.
+        """
+        if not fuse:
+            self.to_qkv = None
+            self.to_kv = None
+            self.fused_projections = False
+            return
+        if self.fused_projections:
+            fused = self.to_qkv if self.to_qkv is not None else self.to_kv
+            if (
+                self.to_v.weight.untyped_storage().data_ptr()
+                == fused.weight.untyped_storage().data_ptr()
+            ):
+                return
+
         is_cross_attention = self.cross_attention_dim != self.query_dim
         device = self.to_q.weight.data.device
         dtype = self.to_q.weight.data.dtype
 
-        if not is_cross_attention:
-            # fetch weight matrices.
-            concatenated_weights = torch.cat(
-                [self.to_q.weight.data, self.to_k.weight.data, self.to_v.weight.data]
-            )
-            in_features = concatenated_weights.shape[1]
-            out_features = concatenated_weights.shape[0]
-
-            # create a new single projection layer and copy over the weights.
-            self.to_qkv = self.linear_cls(
-                in_features, out_features, bias=False, device=device, dtype=dtype
+        def fuse_linears(linears):
+            weight = torch.cat([linear.weight.data for linear in linears])
+            has_bias = linears[0].bias is not None
+            fused = self.linear_cls(
+                weight.shape[1],
+                weight.shape[0],
+                bias=has_bias,
+                device=device,
+                dtype=dtype,
             )
-            self.to_qkv.weight.copy_(concatenated_weights)
-
+            fused.weight.copy_(weight)
+            if has_bias:
+                fused.bias.copy_(torch.cat([linear.bias.data for linear in linears]))
+            share_rows(fused, linears)
+            return fused
+
+        def share_rows(fused, linears, offset=0):
+            # point each linear at its rows of the fused weights
+            for linear in linears:
+                rows = linear.weight.shape[0]
+                linear.weight = nn.Parameter(fused.weight[offset : offset + rows])
+                if fused.bias is not None:
+                    linear.bias = nn.Parameter(fused.bias[offset : offset + rows])
+                offset += rows
+
+        if is_cross_attention:
+            self.to_qkv = None
+            self.to_kv = fuse_linears([self.to_k, self.to_v])
         else:
-            concatenated_weights = torch.cat(
-                [self.to_k.weight.data, self.to_v.weight.data]
+            self.to_qkv = fuse_linears([self.to_q, self.to_k, self.to_v])
+            # self-attention called with explicit encoder states uses the
+            # key/value rows of the same weights
+            self.to_kv = self.linear_cls(
+                self.cross_attention_dim,
+                2 * self.inner_dim,
+                bias=self.to_qkv.bias is not None,
+                device="meta",
             )
-            in_features = concatenated_weights.shape[1]
-            out_features = concatenated_weights.shape[0]
+            share_rows(self.to_qkv, [self.to_kv], offset=self.inner_dim)
+        self.fused_projections = fuse
 
-            self.to_kv = self.linear_cls(
-                in_features, out_features, bias=False, device=device, dtype=dtype
+    def project_qkv(
+        self,
+        hidden_states: torch.Tensor,
+        encoder_hidden_states: Optional[torch.Tensor] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Query, key and value projections, fused when possible."""
+        if (
+            self.fused_projections
+            and encoder_hidden_states is None
+            and self.to_qkv is not None
+        ):
+            return self.to_qkv(hidden_states).chunk(3, dim=-1)
+
+        query = self.to_q(hidden_states)
+
+        if encoder_hidden_states is None:
+            encoder_hidden_states = hidden_states
+        elif self.norm_cross:
+            encoder_hidden_states = self.norm_encoder_hidden_states(
+                encoder_hidden_states
             )
-            self.to_kv.weight.copy_(concatenated_weights)
 
-        self.fused_projections = fuse
+        if self.fused_projections:
+            key, value = self.to_kv(encoder_hidden_states).chunk(2, dim=-1)
+        else:
+            key = self.to_k(encoder_hidden_states)
+            value = self.to_v(encoder_hidden_states)
+        return query, key, value
 
 
 class AttnProcessor:
@@ -517,17 +581,7 @@ class AttnProcessor:
                 1, 2
             )
 
-        query = attn.to_q(hidden_states)
-
-        if encoder_hidden_states is None:
-            encoder_hidden_states = hidden_states
-        elif attn.norm_cross:
-            encoder_hidden_states = attn.norm_encoder_hidden_states(
-                encoder_hidden_states
-            )
-
-        key = attn.to_k(encoder_hidden_states)
-        value = attn.to_v(encoder_hidden_states)
+        query, key, value = attn.project_qkv(hidden_states, encoder_hidden_states)
 
         query = attn.head_to_batch_dim(query)
         key = attn.head_to_batch_dim(key)
@@ -604,17 +658,7 @@ class AttnProcessor2_0:
                 1, 2
             )
 
-        query = attn.to_q(hidden_states)
-
-        if encoder_hidden_states is None:
-            encoder_hidden_states = hidden_states
-        elif attn.norm_cross:
-            encoder_hidden_states = attn.norm_encoder_hidden_states(
-                encoder_hidden_states
-            )
-
-        key = attn.to_k(encoder_hidden_states)
-        value = attn.to_v(encoder_hidden_states)
+        query, key, value = attn.project_qkv(hidden_states, encoder_hidden_states)
 
         inner_dim = key.shape[-1]
         head_dim = inner_dim // attn.heads
@@ -626,9 +670,22 @@ class AttnProcessor2_0:
 
         # the output of sdp = (batch, num_heads, seq_len, head_dim)
         # TODO: add support for attn.scale when we move to Torch 2.1
-        hidden_states = F.scaled_dot_product_attention(
-            query, key, value, attn_mask=attention_mask, dropout_p=0.0, is_causal=False
-        )
+        if (attn.upcast_attention or attn.upcast_softmax) and query.dtype != torch.float32:
+            # the math kernel would run the softmax in the reduced dtype;
+            # autocast must be off or it casts the inputs straight back
+            with torch.autocast(device_type=query.device.type, enabled=False):
+                hidden_states = F.scaled_dot_product_attention(
+                    query.float(),
+                    key.float(),
+                    value.float(),
+                    attn_mask=attention_mask,
+                    dropout_p=0.0,
+                    is_causal=False,
+                )
+        else:
+            hidden_states = F.scaled_dot_product_attention(
+                query, key, value, attn_mask=attention_mask, dropout_p=0.0, is_causal=False
+            )
 
         hidden_states = hidden_states.transpose(1, 2).reshape(
             batch_size, -1, attn.heads * head_dim
@@ -651,3 +708,200 @@ class AttnProcessor2_0:
         hidden_states = hidden_states / attn.rescale_output_factor
 
         return hidden_states
+
+
+class SlicedAttnProcessor:
+    r"""
+    Processor that bounds the memory of the attention scores. Instead of
+    materializing the full `[batch * heads, query_tokens, key_tokens]` score
+    matrix, queries (and, if needed, heads) are processed in slices sized so
+    that the scores and probabilities of one slice fit in
+    `memory_budget_mb`.
+
+    With `online_softmax=True` keys are additionally consumed in blocks of
+    `key_block_size` with a running max/sum (flash-style) accumulation, so
+    the working set no longer grows with the number of key tokens.
+
+    Args:
+        memory_budget_mb (`float`, defaults to 256):
+            Upper bound for the temporary score/probability buffers of one slice.
+        slice_size (`int`, *optional*):
+            Fixed number of query tokens per slice, overrides the budget.
+        online_softmax (`bool`, defaults to `False`):
+            Accumulate over key blocks with an online softmax.
+        key_block_size (`int`, defaults to 1024):
+            Number of key tokens per block when `online_softmax` is set.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: float = 256,
+        slice_size: Optional[int] = None,
+        online_softmax: bool = False,
+        key_block_size: int = 1024,
+    ):
+        self.memory_budget_mb = memory_budget_mb
+        self.slice_size = slice_size
+        self.online_softmax = online_softmax
+        self.key_block_size = key_block_size
+
+    def __call__(
+        self,
+        attn: Attention,
+        hidden_states: torch.FloatTensor,
+        encoder_hidden_states: Optional[torch.FloatTensor] = None,
+        attention_mask: Optional[torch.FloatTensor] = None,
+    ) -> torch.Tensor:
+        residual = hidden_states
+
+        input_ndim = hidden_states.ndim
+
+        if input_ndim == 4:
+            batch_size, channel, height, width = hidden_states.shape
+            hidden_states = hidden_states.view(
+                batch_size, channel, height * width
+            ).transpose(1, 2)
+
+        batch_size, sequence_length, _ = (
+            hidden_states.shape
+            if encoder_hidden_states is None
+            else encoder_hidden_states.shape
+        )
+        attention_mask = attn.prepare_attention_mask(
+            attention_mask, sequence_length, batch_size
+        )
+
+        if attn.group_norm is not None:
+            hidden_states = attn.group_norm(hidden_states.transpose(1, 2)).transpose(
+                1, 2
+            )
+
+        query, key, value = attn.project_qkv(hidden_states, encoder_hidden_states)
+
+        query = attn.head_to_batch_dim(query)
+        key = attn.head_to_batch_dim(key)
+        value = attn.head_to_batch_dim(value)
+
+        hidden_states = self.sliced_attention(attn, query, key, value, attention_mask)
+        hidden_states = attn.batch_to_head_dim(hidden_states)
+
+        # linear proj
+        hidden_states = attn.to_out[0](hidden_states)
+        # dropout
+        hidden_states = attn.to_out[1](hidden_states)
+
+        if input_ndim == 4:
+            hidden_states = hidden_states.transpose(-1, -2).reshape(
+                batch_size, channel, height, width
+            )
+
+        if attn.residual_connection:
+            hidden_states = hidden_states + residual
+
+        hidden_states = hidden_states / attn.rescale_output_factor
+
+        return hidden_states
+
+    def slice_sizes(
+        self, attn: Attention, query: torch.Tensor, key: torch.Tensor
+    ) -> Tuple[int, int]:
+        """Number of (heads, query tokens) processed per slice."""
+        batch_heads, query_tokens, _ = query.shape
+        score_bytes = (
+            4
+            if attn.upcast_attention or attn.upcast_softmax
+            else query.element_size()
+        )
+        if self.online_softmax:
+            # scores, probabilities and the exp correction of one key block
+            row_bytes = 3 * min(key.shape[1], self.key_block_size) * score_bytes
+        else:
+            # scores and probabilities over all keys
+            row_bytes = 2 * key.shape[1] * score_bytes
+
+        if self.slice_size is not None:
+            return batch_heads, min(query_tokens, self.slice_size)
+
+        rows = max(1, int(self.memory_budget_mb * 1024**2) // row_bytes)
+        head_slice = min(batch_heads, max(1, rows // query_tokens))
+        query_slice = min(query_tokens, max(1, rows // head_slice))
+        return head_slice, query_slice
+
+    def sliced_attention(
+        self,
+        attn: Attention,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        batch_heads, query_tokens, _ = query.shape
+        head_slice, query_slice = self.slice_sizes(attn, query, key)
+
+        hidden_states = query.new_empty(batch_heads, query_tokens, value.shape[-1])
+        for h_start in range(0, batch_heads, head_slice):
+            h_end = h_start + head_slice
+            for q_start in range(0, query_tokens, query_slice):
+                q_end = q_start + query_slice
+                mask_slice = None
+                if attention_mask is not None:
+                    mask_slice = attention_mask[h_start:h_end]
+                    if mask_slice.shape[1] != 1:
+                        mask_slice = mask_slice[:, q_start:q_end]
+
+                if self.online_softmax:
+                    out = self.online_attention(
+                        attn,
+                        query[h_start:h_end, q_start:q_end],
+                        key[h_start:h_end],
+                        value[h_start:h_end],
+                        mask_slice,
+                    )
+                else:
+                    attention_probs = attn.get_attention_scores(
+                        query[h_start:h_end, q_start:q_end],
+                        key[h_start:h_end],
+                        mask_slice,
+                    )
+                    out = torch.bmm(attention_probs, value[h_start:h_end])
+                    del attention_probs
+                hidden_states[h_start:h_end, q_start:q_end] = out
+
+        return hidden_states
+
+    def online_attention(
+        self,
+        attn: Attention,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        dtype = query.dtype
+        acc_dtype = (
+            torch.float32 if attn.upcast_attention or attn.upcast_softmax else dtype
+        )
+        query = query.to(acc_dtype) * attn.scale
+
+        running_max = query.new_full((*query.shape[:2], 1), float("-inf"))
+        running_sum = query.new_zeros((*query.shape[:2], 1))
+        acc = query.new_zeros((*query.shape[:2], value.shape[-1]))
+        for k_start in range(0, key.shape[1], self.key_block_size):
+            k_end = k_start + self.key_block_size
+            scores = torch.bmm(
+                query, key[:, k_start:k_end].to(acc_dtype).transpose(-1, -2)
+            )
+            if attention_mask is not None:
+                scores = scores + attention_mask[..., k_start:k_end].to(acc_dtype)
+            block_max = torch.maximum(running_max, scores.amax(dim=-1, keepdim=True))
+            correction = torch.exp(running_max - block_max)
+            probs = torch.exp(scores - block_max)
+            del scores
+            running_sum = running_sum * correction + probs.sum(dim=-1, keepdim=True)
+            acc = acc * correction + torch.bmm(
+                probs, value[:, k_start:k_end].to(acc_dtype)
+            )
+            running_max = block_max
+            del probs
+
+        return (acc / running_sum).to(dtype)
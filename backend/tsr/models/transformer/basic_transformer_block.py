@@ -153,6 +153,27 @@ class BasicTransformerBlock(nn.Module):
         encoder_hidden_states: Optional[torch.FloatTensor] = None,
         encoder_attention_mask: Optional[torch.FloatTensor] = None,
     ) -> torch.FloatTensor:
+        hidden_states = self.forward_self_attention(
+            hidden_states,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+        )
+        return self.forward_cross_attention(
+            hidden_states,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+        )
+
+    def forward_self_attention(
+        self,
+        hidden_states: torch.FloatTensor,
+        attention_mask: Optional[torch.FloatTensor] = None,
+        encoder_hidden_states: Optional[torch.FloatTensor] = None,
+    ) -> torch.FloatTensor:
+        """
+        First half of `forward`: norm1, attn1 and its residual. Depends on
+        `encoder_hidden_states` only with `only_cross_attention`.
+        """
         # Notice that normalization is always applied before the real computation in the following blocks.
         # 0. Self-Attention
         norm_hidden_states = self.norm1(hidden_states)
@@ -166,7 +187,15 @@ class BasicTransformerBlock(nn.Module):
         )
 
         hidden_states = attn_output + hidden_states
+        return hidden_states
 
+    def forward_cross_attention(
+        self,
+        hidden_states: torch.FloatTensor,
+        encoder_hidden_states: Optional[torch.FloatTensor] = None,
+        encoder_attention_mask: Optional[torch.FloatTensor] = None,
+    ) -> torch.FloatTensor:
+        """Second half of `forward`: cross-attention and feed-forward."""
         # 3. Cross-Attention
         if self.attn2 is not None:
             norm_hidden_states = self.norm2(hidden_states)
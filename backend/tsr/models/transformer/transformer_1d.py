@@ -44,6 +44,7 @@ import torch.nn.functional as F
 from torch import nn
 
 from ...utils import BaseModule
+from .attention import Attention
 from .basic_transformer_block import BasicTransformerBlock
 
 
@@ -119,6 +120,15 @@ class Transformer1D(BaseModule):
 
         self.gradient_checkpointing = self.cfg.gradient_checkpointing
 
+    def set_attn_processor(self, processor) -> None:
+        """
+        Use `processor` (e.g. `SlicedAttnProcessor`) for the self- and
+        cross-attention of every transformer block.
+        """
+        for module in self.modules():
+            if isinstance(module, Attention):
+                module.set_processor(processor)
+
     def forward(
         self,
         hidden_states: torch.Tensor,
@@ -177,6 +187,21 @@ class Transformer1D(BaseModule):
             encoder_attention_mask = encoder_attention_mask.unsqueeze(1)
 
         # 1. Input
+        residual, hidden_states = self._project_in(hidden_states)
+
+        # 2. Blocks
+        hidden_states = self._run_blocks(
+            self.transformer_blocks,
+            hidden_states,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+        )
+
+        # 3. Output
+        return self._project_out(residual, hidden_states)
+
+    def _project_in(self, hidden_states: torch.Tensor):
         batch, _, seq_len = hidden_states.shape
         residual = hidden_states
 
@@ -186,9 +211,17 @@ class Transformer1D(BaseModule):
             batch, seq_len, inner_dim
         )
         hidden_states = self.proj_in(hidden_states)
+        return residual, hidden_states
 
-        # 2. Blocks
-        for block in self.transformer_blocks:
+    def _run_blocks(
+        self,
+        blocks,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        encoder_hidden_states: Optional[torch.Tensor] = None,
+        encoder_attention_mask: Optional[torch.Tensor] = None,
+    ):
+        for block in blocks:
             if self.training and self.gradient_checkpointing:
                 hidden_states = torch.utils.checkpoint.checkpoint(
                     block,
@@ -205,8 +238,10 @@ class Transformer1D(BaseModule):
                     encoder_hidden_states=encoder_hidden_states,
                     encoder_attention_mask=encoder_attention_mask,
                 )
+        return hidden_states
 
-        # 3. Output
+    def _project_out(self, residual: torch.Tensor, hidden_states: torch.Tensor):
+        batch, inner_dim, seq_len = residual.shape
         hidden_states = self.proj_out(hidden_states)
         hidden_states = (
             hidden_states.reshape(batch, seq_len, inner_dim)
@@ -217,3 +252,50 @@ class Transformer1D(BaseModule):
         output = hidden_states + residual
 
         return output
+
+    def forward_prefix(
+        self,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+    ):
+        """
+        Everything up to the first cross-attention: input norm, `proj_in` and
+        the first block's self-attention. Independent of the image tokens,
+        so for a constant input it can be computed once and re-used (see
+        `TSR.backbone_prefix`). Returns `(residual, hidden_states)` for
+        `forward_suffix`. Inference only, and not valid when the first block
+        has `only_cross_attention`; `forward` is the general path.
+        """
+        # 1. Input
+        residual, hidden_states = self._project_in(hidden_states)
+
+        # 2. Blocks, up to the first cross-attention
+        hidden_states = self.transformer_blocks[0].forward_self_attention(
+            hidden_states, attention_mask=attention_mask
+        )
+        return residual, hidden_states
+
+    def forward_suffix(
+        self,
+        residual: torch.Tensor,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        encoder_hidden_states: Optional[torch.Tensor] = None,
+        encoder_attention_mask: Optional[torch.Tensor] = None,
+    ):
+        # 2. Blocks
+        hidden_states = self.transformer_blocks[0].forward_cross_attention(
+            hidden_states,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+        )
+        hidden_states = self._run_blocks(
+            self.transformer_blocks[1:],
+            hidden_states,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+        )
+
+        # 3. Output
+        return self._project_out(residual, hidden_states)
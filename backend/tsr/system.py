@@ -1,11 +1,16 @@
+import contextlib
+import hashlib
+import json
 import math
 import os
+import shutil
 from dataclasses import dataclass, field
-from typing import List, Union
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 import PIL.Image
 import torch
+import torch.nn as nn
 import torch.nn.functional as F
 import trimesh
 from einops import rearrange
@@ -13,9 +18,17 @@ from huggingface_hub import hf_hub_download
 from omegaconf import OmegaConf
 from PIL import Image
 
-from .models.isosurface import MarchingCubeHelper
+from .models.isosurface import (
+    MarchingCubeHelper,
+    coarse_lattice,
+    lattice_cells,
+    straddling_cells,
+    upsample_lattice,
+)
+from .models.transformer.attention import Attention
 from .utils import (
     BaseModule,
+    CompiledFunction,
     ImagePreprocessor,
     find_class,
     get_spherical_cameras,
@@ -23,6 +36,22 @@ from .utils import (
 )
 
 
+def density_to_fp16(density: torch.Tensor) -> np.ndarray:
+    # deep inside the object the density can exceed the fp16 range
+    return density.clamp(max=torch.finfo(torch.float16).max).half().cpu().numpy()
+
+
+# layout of bundles written by `TSR.save_bundle`
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_MANIFEST_NAME = "manifest.json"
+
+PRECISION_DTYPES = {
+    "fp32": torch.float32,
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+
 class TSR(BaseModule):
     @dataclass
     class Config(BaseModule.Config):
@@ -50,9 +79,40 @@ class TSR(BaseModule):
 
     @classmethod
     def from_pretrained(
-        cls, pretrained_model_name_or_path: str, config_name: str, weight_name: str
+        cls,
+        pretrained_model_name_or_path: str,
+        config_name: str,
+        weight_name: str,
+        quantize: bool = False,
+        quantized_cache_dir: Optional[str] = None,
+        fuse_projections: bool = False,
     ):
-        if os.path.isdir(pretrained_model_name_or_path):
+        """
+        With `quantize=True` returns the CPU int8 variant (see
+        `quantize_dynamic`). If `quantized_cache_dir` is given the quantized
+        state dict is cached there and later loads skip the fp32 weights.
+        `fuse_projections=True` fuses the attention projections of every
+        backbone block (see `TSR.fuse_projections`); it cannot be combined
+        with `quantize`. Bundles store the fused layout, so there the fused
+        weights and their q/k/v views are assigned from the memory map and
+        stay shared between processes. Fusing a model loaded any other way,
+        or from a bundle written before, concatenates them into a private
+        copy per process instead.
+        """
+        if quantize and fuse_projections:
+            raise ValueError(
+                "Quantized models keep separate attention projections, "
+                "quantize or fuse_projections, not both."
+            )
+        manifest = cls.read_bundle_manifest(pretrained_model_name_or_path)
+        if manifest is not None:
+            config_path = os.path.join(
+                pretrained_model_name_or_path, manifest["config"]
+            )
+            weight_path = os.path.join(
+                pretrained_model_name_or_path, manifest["weights"]
+            )
+        elif os.path.isdir(pretrained_model_name_or_path):
             config_path = os.path.join(pretrained_model_name_or_path, config_name)
             weight_path = os.path.join(pretrained_model_name_or_path, weight_name)
         else:
@@ -64,12 +124,153 @@ class TSR(BaseModule):
             )
 
         cfg = OmegaConf.load(config_path)
+        if manifest is not None:
+            cfg.image_tokenizer.pretrained_model_name_or_path = os.path.join(
+                pretrained_model_name_or_path, manifest["image_tokenizer"]
+            )
         OmegaConf.resolve(cfg)
+
+        if manifest is not None and not quantize:
+            # skip random init, the bundle weights are memory-mapped and
+            # assigned in place instead of copied
+            with torch.device("meta"):
+                model = cls(cfg)
+            if manifest.get("fused_projections"):
+                # lay the modules out like the stored state dict
+                model.fuse_projections()
+            ckpt = torch.load(weight_path, map_location="cpu", mmap=True)
+            model.load_state_dict(ckpt, assign=True)
+            model.materialize_non_persistent_buffers()
+            # unfusing keeps the q/k/v views of the mapped fused weights
+            model.fuse_projections(fuse_projections)
+            return model
+
         model = cls(cfg)
+
+        cache_path = None
+        if quantize and quantized_cache_dir is not None:
+            cache_key = hashlib.sha256(
+                f"{os.path.abspath(weight_path)}:{os.path.getsize(weight_path)}:"
+                f"{os.path.getmtime(weight_path)}:{torch.__version__}".encode("utf-8")
+            ).hexdigest()[:16]
+            cache_path = os.path.join(quantized_cache_dir, f"{cache_key}.int8.pt")
+            if os.path.isfile(cache_path):
+                model.quantize_dynamic()
+                # packed int8 weights are not plain tensors
+                ckpt = torch.load(cache_path, map_location="cpu", weights_only=False)
+                model.load_state_dict(ckpt)
+                return model
+
         ckpt = torch.load(weight_path, map_location="cpu")
+        if manifest is not None and manifest.get("fused_projections"):
+            # the q/k/v views are stored as well
+            ckpt = {
+                k: v
+                for k, v in ckpt.items()
+                if ".to_qkv." not in k and ".to_kv." not in k
+            }
         model.load_state_dict(ckpt)
+        if fuse_projections:
+            model.fuse_projections()
+        if quantize:
+            model.quantize_dynamic()
+            if cache_path is not None:
+                os.makedirs(quantized_cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                torch.save(model.state_dict(), tmp_path)
+                os.replace(tmp_path, cache_path)
         return model
 
+    @staticmethod
+    def read_bundle_manifest(path: str) -> Optional[dict]:
+        manifest_path = os.path.join(path, BUNDLE_MANIFEST_NAME)
+        if not os.path.isfile(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(
+                f"{path} is a version {manifest.get('format_version')} model bundle, "
+                f"expected version {BUNDLE_FORMAT_VERSION}."
+            )
+        return manifest
+
+    def save_bundle(
+        self,
+        bundle_dir: str,
+        model_version: str,
+        rembg_model_path: Optional[str] = None,
+    ):
+        """
+        Write an offline, versioned model bundle that `from_pretrained` can
+        load without network access:
+
+            manifest.json     format version, model version, file layout
+            config.yaml       the TSR config
+            vit/config.json   the DINO ViT config
+            model.pt          fp32 state dict, memory-mappable
+            rembg/<name>      optional background-removal model
+
+        The attention projections are stored fused, with `to_q`, `to_k` and
+        `to_v` as views of the fused weights, so loading a fused model maps
+        them instead of concatenating a private copy; the file is no larger.
+        Save from an unquantized model on the CPU.
+        """
+        assert not self.quantized, "Save bundles from the fp32 model."
+        tmp_dir = f"{bundle_dir.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(os.path.join(tmp_dir, "vit"))
+
+        cfg = OmegaConf.to_container(self.cfg, resolve=True)
+        cfg["image_tokenizer"]["pretrained_model_name_or_path"] = "vit"
+        OmegaConf.save(OmegaConf.create(cfg), os.path.join(tmp_dir, "config.yaml"))
+        self.image_tokenizer.model.config.to_json_file(
+            os.path.join(tmp_dir, "vit", "config.json")
+        )
+        fused = any(
+            isinstance(module, Attention) and module.fused_projections
+            for module in self.backbone.modules()
+        )
+        self.fuse_projections()
+        # views are saved with the storage they share, which is written once
+        torch.save(self.state_dict(), os.path.join(tmp_dir, "model.pt"))
+        self.fuse_projections(fused)
+
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "model_version": model_version,
+            "torch_version": torch.__version__,
+            "config": "config.yaml",
+            "image_tokenizer": "vit",
+            "weights": "model.pt",
+            "fused_projections": True,
+        }
+        if rembg_model_path is not None:
+            os.makedirs(os.path.join(tmp_dir, "rembg"))
+            shutil.copy2(
+                rembg_model_path,
+                os.path.join(tmp_dir, "rembg", os.path.basename(rembg_model_path)),
+            )
+            manifest["rembg"] = "rembg"
+        with open(os.path.join(tmp_dir, BUNDLE_MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(bundle_dir, ignore_errors=True)
+        os.rename(tmp_dir, bundle_dir)
+
+    def materialize_non_persistent_buffers(self):
+        for module in self.modules():
+            if hasattr(module, "reset_non_persistent_buffers"):
+                module.reset_non_persistent_buffers()
+        meta = [
+            name
+            for name, tensor in list(self.named_parameters())
+            + list(self.named_buffers())
+            if tensor.is_meta
+        ]
+        if meta:
+            raise RuntimeError(f"Tensors left uninitialized after loading: {meta}")
+
     def configure(self):
         self.image_tokenizer = find_class(self.cfg.image_tokenizer_cls)(
             self.cfg.image_tokenizer
@@ -83,6 +284,145 @@ class TSR(BaseModule):
         self.renderer = find_class(self.cfg.renderer_cls)(self.cfg.renderer)
         self.image_processor = ImagePreprocessor()
         self.isosurface_helper = None
+        self.marching_cubes_options = {}
+        self.precision = "fp32"
+        self.quantized = False
+        # the backbone input is a learned constant, so everything before the
+        # first cross-attention is the same for every request
+        self.cache_backbone_prefix = (
+            hasattr(self.backbone, "forward_prefix")
+            and not self.backbone.transformer_blocks[0].only_cross_attention
+        )
+        self._backbone_prefix = None
+
+    def _backbone_prefix_modules(self) -> List[nn.Module]:
+        block = self.backbone.transformer_blocks[0]
+        return [
+            self.tokenizer,
+            self.backbone.norm,
+            self.backbone.proj_in,
+            block.norm1,
+            block.attn1,
+        ]
+
+    def _backbone_prefix_key(self, device) -> tuple:
+        # any change to the weights (load_state_dict, in-place edits, .to(),
+        # quantization or fusion swapping modules) changes the key
+        key = [self.precision, torch.device(device).type]
+        for module in self._backbone_prefix_modules():
+            for submodule in module.modules():
+                key.append((id(submodule), type(submodule)))
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                key.append(
+                    (tensor.data_ptr(), tensor._version, tensor.dtype, tensor.device)
+                )
+        return tuple(key)
+
+    def backbone_prefix(self, batch_size: int):
+        """
+        `Transformer1D.forward_prefix` of the constant triplane tokens,
+        computed once and broadcast to `batch_size`.
+        """
+        device = self.tokenizer.embeddings.device
+        key = self._backbone_prefix_key(device)
+        if self._backbone_prefix is None or self._backbone_prefix[0] != key:
+            with torch.no_grad():
+                residual, hidden_states = self.backbone.forward_prefix(
+                    self.tokenizer(1)
+                )
+            self._backbone_prefix = (key, residual, hidden_states)
+        _, residual, hidden_states = self._backbone_prefix
+        return (
+            residual.expand(batch_size, -1, -1),
+            hidden_states.expand(batch_size, -1, -1),
+        )
+
+    def fuse_projections(self, fuse: bool = True):
+        """
+        Run the q/k/v (self-attention) and k/v (cross-attention) projections
+        of every backbone block as one GEMM. Call after moving the model to
+        its device, `.to()` copies the shared weight views separately.
+        Quantized models cannot be fused: each view would be packed into an
+        int8 copy of its own, storing every projection twice.
+        """
+        if fuse and self.quantized:
+            raise ValueError("Fuse the attention projections of fp32 models only.")
+        for module in self.backbone.modules():
+            if isinstance(module, Attention):
+                module.fuse_projections(fuse)
+
+    def quantize_dynamic(self):
+        """
+        Replace the `nn.Linear` layers of the backbone (attention projections
+        and feed-forwards) and of the NeRF decoder with int8-weight, dynamically
+        quantized versions. CPU only, and only in fp32 precision, on a model
+        whose projections are not fused.
+        """
+        if any(
+            isinstance(module, Attention) and module.fused_projections
+            for module in self.backbone.modules()
+        ):
+            raise ValueError("Quantize models with unfused attention projections.")
+        for name in ["backbone", "decoder"]:
+            torch.ao.quantization.quantize_dynamic(
+                getattr(self, name), {nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        self.quantized = True
+
+    def set_precision(self, precision: str, device: Optional[str] = None):
+        """
+        Run the tokenizer, backbone, post-processor and NeRF decoder under
+        autocast with `precision` ("fp32", "bf16" or "fp16"; fp16 needs an
+        accelerator). Attention softmax, density activation and marching
+        cubes stay in fp32. Pass the `device` the model will run on to reject
+        an unsupported combination here rather than on the first request.
+        """
+        assert precision in PRECISION_DTYPES, f"Unknown precision: {precision}"
+        if self.quantized and precision != "fp32":
+            raise ValueError("Quantized models only run in fp32 precision.")
+        if (
+            device is not None
+            and torch.device(device).type == "cpu"
+            and precision == "fp16"
+        ):
+            raise ValueError(
+                "fp16 autocast is not supported on CPU, use bf16 instead."
+            )
+        self.precision = precision
+        for module in self.modules():
+            if isinstance(module, Attention):
+                module.upcast_softmax = precision != "fp32"
+
+    def autocast(self, device):
+        if self.precision == "fp32":
+            return contextlib.nullcontext()
+        device_type = torch.device(device).type
+        if device_type == "cpu" and self.precision == "fp16":
+            raise ValueError(
+                "fp16 autocast is not supported on CPU, use bf16 instead."
+            )
+        return torch.autocast(
+            device_type=device_type, dtype=PRECISION_DTYPES[self.precision]
+        )
+
+    def enable_compile(self, **compile_kwargs):
+        """
+        Opt-in compiled execution of the backbone, the triplane upsampler and
+        the per-chunk triplane query + decoder; each falls back to eager mode
+        if compilation fails. Graphs are specialized on shapes, so run a
+        warmup pass per batch size before serving.
+        """
+        compile_kwargs.setdefault("dynamic", False)
+        self.backbone.forward = CompiledFunction(
+            self.backbone.forward, **compile_kwargs
+        )
+        self.backbone.forward_suffix = CompiledFunction(
+            self.backbone.forward_suffix, **compile_kwargs
+        )
+        self.post_processor.forward = CompiledFunction(
+            self.post_processor.forward, **compile_kwargs
+        )
+        self.renderer.enable_compile(**compile_kwargs)
 
     def forward(
         self,
@@ -96,28 +436,59 @@ class TSR(BaseModule):
         ],
         device: str,
     ) -> torch.FloatTensor:
+        input_image_tokens = self.encode_image(image, device)
+        return self.forward_tokens(input_image_tokens)
+
+    def encode_image(
+        self,
+        image: Union[
+            PIL.Image.Image,
+            np.ndarray,
+            torch.FloatTensor,
+            List[PIL.Image.Image],
+            List[np.ndarray],
+            List[torch.FloatTensor],
+        ],
+        device: str,
+    ) -> torch.FloatTensor:
+        """Image tokenizer (DINO) features, `(B, Nt, C)`, for the backbone."""
         rgb_cond = self.image_processor(image, self.cfg.cond_image_size)[:, None].to(
             device
         )
-        batch_size = rgb_cond.shape[0]
 
-        input_image_tokens: torch.Tensor = self.image_tokenizer(
-            rearrange(rgb_cond, "B Nv H W C -> B Nv C H W", Nv=1),
-        )
+        with self.autocast(device):
+            input_image_tokens: torch.Tensor = self.image_tokenizer(
+                rearrange(rgb_cond, "B Nv H W C -> B Nv C H W", Nv=1),
+            )
 
-        input_image_tokens = rearrange(
-            input_image_tokens, "B Nv C Nt -> B (Nv Nt) C", Nv=1
-        )
+            input_image_tokens = rearrange(
+                input_image_tokens, "B Nv C Nt -> B (Nv Nt) C", Nv=1
+            )
+        return input_image_tokens
 
-        tokens: torch.Tensor = self.tokenizer(batch_size)
+    def forward_tokens(self, input_image_tokens: torch.FloatTensor) -> torch.FloatTensor:
+        """Scene codes from the output of `encode_image`."""
+        batch_size = input_image_tokens.shape[0]
 
-        tokens = self.backbone(
-            tokens,
-            encoder_hidden_states=input_image_tokens,
-        )
+        with self.autocast(input_image_tokens.device):
+            if self.cache_backbone_prefix and not self.training:
+                residual, hidden_states = self.backbone_prefix(batch_size)
+                tokens = self.backbone.forward_suffix(
+                    residual,
+                    hidden_states,
+                    encoder_hidden_states=input_image_tokens,
+                )
+            else:
+                tokens: torch.Tensor = self.tokenizer(batch_size)
+
+                tokens = self.backbone(
+                    tokens,
+                    encoder_hidden_states=input_image_tokens,
+                )
 
-        scene_codes = self.post_processor(self.tokenizer.detokenize(tokens))
-        return scene_codes
+            scene_codes = self.post_processor(self.tokenizer.detokenize(tokens))
+        # scene codes are stored and re-used, keep them in full precision
+        return scene_codes.float()
 
     def render(
         self,
@@ -151,11 +522,11 @@ class TSR(BaseModule):
         for scene_code in scene_codes:
             images_ = []
             for i in range(n_views):
-                with torch.no_grad():
+                with torch.no_grad(), self.autocast(scene_codes.device):
                     image = self.renderer(
                         self.decoder, scene_code, rays_o[i], rays_d[i]
                     )
-                images_.append(process_output(image))
+                images_.append(process_output(image.float()))
             images.append(images_)
 
         return images
@@ -166,23 +537,209 @@ class TSR(BaseModule):
             and self.isosurface_helper.resolution == resolution
         ):
             return
-        self.isosurface_helper = MarchingCubeHelper(resolution)
+        self.isosurface_helper = MarchingCubeHelper(
+            resolution, **self.marching_cubes_options
+        )
+
+    def set_marching_cubes_workers(
+        self, num_workers: int, block_size: int = 64, executor: str = "process"
+    ):
+        """Triangulate CPU volumes in blocks of `block_size` cells, `num_workers` in parallel."""
+        assert num_workers >= 1, "num_workers must be a positive integer."
+        self.marching_cubes_options = {
+            "num_workers": num_workers,
+            "block_size": block_size,
+            "executor": executor,
+        }
+        self.isosurface_helper = None
+
+    def lattice_axis(self, resolution: int, device) -> torch.Tensor:
+        """Positions of the marching cubes grid vertices along one axis."""
+        points_range = MarchingCubeHelper.points_range
+        radius = self.renderer.cfg.radius
+        return scale_tensor(
+            torch.linspace(*points_range, resolution, device=device),
+            points_range,
+            (-radius, radius),
+        )
+
+    def density_slab(
+        self, scene_code: torch.Tensor, resolution: int, start: int, stop: int
+    ) -> torch.Tensor:
+        """Density on vertex rows [start, stop) of the grid, as a (stop - start, R, R) volume."""
+        axis = self.lattice_axis(resolution, scene_code.device)
+        with torch.no_grad(), self.autocast(scene_code.device):
+            density = self.renderer.query_lattice(
+                self.decoder, (axis[start:stop], axis, axis), scene_code
+            )
+        density = density["density_act"].float()
+        return density.view(stop - start, resolution, resolution)
+
+    def density_grid(
+        self,
+        scene_code: torch.Tensor,
+        resolution: int,
+        threshold: float = 25.0,
+        coarse_block_size: int = 0,
+        refine_margin: float = 5.0,
+    ) -> Tuple[torch.Tensor, int]:
+        """
+        Density on the resolution^3 marching cubes lattice as an fp32
+        (R, R, R) volume, and the number of decoder evaluations it took.
+
+        With `coarse_block_size` > 0 the density is first evaluated every
+        `coarse_block_size` vertices. Only coarse cells whose corner range
+        comes within `refine_margin` of `threshold`, and their neighbours,
+        are evaluated at full resolution; everywhere else the volume is
+        trilinearly interpolated from the coarse lattice, which cannot cross
+        the threshold there.
+        """
+        device = scene_code.device
+        axis = self.lattice_axis(resolution, device)
+        if coarse_block_size <= 0:
+            # the marching cubes grid is a lattice: sample each plane once
+            # instead of three lookups per grid vertex
+            with torch.no_grad(), self.autocast(device):
+                density = self.renderer.query_lattice(self.decoder, axis, scene_code)
+            density = density["density_act"].float()
+            return density.view(resolution, resolution, resolution), resolution**3
+
+        indices = coarse_lattice(resolution, coarse_block_size)
+        num_coarse = len(indices)
+        with torch.no_grad(), self.autocast(device):
+            coarse = self.renderer.query_lattice(
+                self.decoder, axis[indices.to(device)], scene_code
+            )
+        coarse = coarse["density_act"].float().view(num_coarse, num_coarse, num_coarse)
+        evaluations = num_coarse**3
+
+        active = straddling_cells(coarse, threshold, refine_margin)
+        active = F.max_pool3d(active[None, None].float(), 3, stride=1, padding=1)
+        active = active[0, 0] > 0
+        density = upsample_lattice(coarse, indices, resolution)
+
+        # a fine vertex is refined if any coarse cell it belongs to is active
+        first, last, _ = lattice_cells(indices, resolution)
+        first, last = first.to(device), last.to(device)
+        for x0 in range(0, resolution, coarse_block_size):
+            x1 = min(x0 + coarse_block_size, resolution)
+            refine = torch.zeros(
+                x1 - x0, resolution, resolution, dtype=torch.bool, device=device
+            )
+            for cx in (first[x0:x1], last[x0:x1]):
+                for cy in (first, last):
+                    for cz in (first, last):
+                        refine |= active[cx[:, None, None], cy[None, :, None], cz]
+            points = refine.nonzero()
+            if len(points) == 0:
+                continue
+            points[:, 0] += x0
+            with torch.no_grad(), self.autocast(device):
+                values = self.renderer.query_triplane(
+                    self.decoder, axis[points], scene_code
+                )["density_act"]
+            density[points[:, 0], points[:, 1], points[:, 2]] = values.float()[:, 0]
+            evaluations += len(points)
+        return density, evaluations
+
+    def _triangulate_density(
+        self,
+        scene_code: torch.Tensor,
+        resolution: int,
+        threshold: float,
+        coarse_block_size: int,
+        refine_margin: float,
+        slab_size: int,
+        volume: Optional[np.ndarray] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Evaluate and triangulate the density, copying it into `volume` if given."""
+        if slab_size > 0:
+
+            def slab(start, stop):
+                density = self.density_slab(scene_code, resolution, start, stop)
+                if volume is not None:
+                    volume[start:stop] = density_to_fp16(density)
+                return density.sub_(threshold)
+
+            return self.isosurface_helper.forward_slabs(slab, slab_size)
+        density, _ = self.density_grid(
+            scene_code, resolution, threshold, coarse_block_size, refine_margin
+        )
+        if volume is not None:
+            volume[:] = density_to_fp16(density)
+        # in place: no negated copies of the volume
+        v_pos, t_pos_idx = self.isosurface_helper.triangulate(density.sub_(threshold))
+        return v_pos / (resolution - 1.0), t_pos_idx
+
+    def _triangulate_cached(
+        self, volume: np.ndarray, threshold: float, slab_size: int, device
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Triangulate a stored fp16 volume, reading one slab at a time if `slab_size` > 0."""
 
-    def extract_mesh(self, scene_codes, has_vertex_color, resolution: int = 256, threshold: float = 25.0):
+        def load(start, stop):
+            density = np.asarray(volume[start:stop], dtype=np.float32)
+            return torch.from_numpy(density).to(device).sub_(threshold)
+
+        if slab_size > 0:
+            return self.isosurface_helper.forward_slabs(load, slab_size)
+        v_pos, t_pos_idx = self.isosurface_helper.triangulate(load(0, len(volume)))
+        return v_pos / (len(volume) - 1.0), t_pos_idx
+
+    def extract_mesh(
+        self,
+        scene_codes,
+        has_vertex_color,
+        resolution: int = 256,
+        threshold: float = 25.0,
+        coarse_block_size: int = 0,
+        refine_margin: float = 5.0,
+        slab_size: int = 0,
+        density_cache=None,
+    ):
+        """
+        With `slab_size` > 0 the density is evaluated and triangulated one
+        slab of `slab_size` cells at a time, so peak memory follows the slab
+        size rather than resolution^3; `coarse_block_size` speeds up the
+        full-volume path instead and cannot be combined with it.
+
+        `density_cache` (see `density_cache.DensityVolumeCache` in the
+        service) stores the density volumes, so extracting the same scene
+        code at the same resolution again, at any threshold, only runs
+        marching cubes. Volumes refined around `threshold` by the coarse
+        pass are stored separately and only reused at that threshold.
+        """
+        if slab_size > 0 and coarse_block_size > 0:
+            raise ValueError("coarse_block_size and slab_size cannot be combined")
         self.set_marching_cubes_resolution(resolution)
+        variant = (
+            f"coarse{coarse_block_size}m{refine_margin:g}t{threshold:g}"
+            if coarse_block_size > 0
+            else ""
+        )
         meshes = []
         for scene_code in scene_codes:
-            with torch.no_grad():
-                density = self.renderer.query_triplane(
-                    self.decoder,
-                    scale_tensor(
-                        self.isosurface_helper.grid_vertices.to(scene_codes.device),
-                        self.isosurface_helper.points_range,
-                        (-self.renderer.cfg.radius, self.renderer.cfg.radius),
-                    ),
-                    scene_code,
-                )["density_act"]
-            v_pos, t_pos_idx = self.isosurface_helper(-(density - threshold))
+            cached, writer = None, contextlib.nullcontext()
+            if density_cache is not None:
+                key = density_cache.key(scene_code)
+                cached = density_cache.get(key, resolution, variant)
+                writer = density_cache.writer(key, resolution, variant)
+            if cached is not None:
+                v_pos, t_pos_idx = self._triangulate_cached(
+                    cached, threshold, slab_size, scene_code.device
+                )
+            else:
+                with writer as volume:
+                    v_pos, t_pos_idx = self._triangulate_density(
+                        scene_code,
+                        resolution,
+                        threshold,
+                        coarse_block_size,
+                        refine_margin,
+                        slab_size,
+                        volume,
+                    )
+            v_pos = v_pos.to(scene_code.device)
+            t_pos_idx = t_pos_idx.to(scene_code.device)
             v_pos = scale_tensor(
                 v_pos,
                 self.isosurface_helper.points_range,
@@ -1,5 +1,7 @@
 import importlib
+import logging
 import math
+import threading
 from collections import defaultdict
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
@@ -61,7 +63,143 @@ class BaseModule(nn.Module):
         raise NotImplementedError
 
 
+class CompiledFunction:
+    """
+    A `torch.compile`d version of `fn` that falls back to calling `fn`
+    eagerly, for good, the first time compilation or the compiled graph
+    fails (e.g. no C++ toolchain for inductor, or an unsupported op).
+    """
+
+    def __init__(self, fn: Callable, **compile_kwargs) -> None:
+        self.eager = fn
+        self.compiled = torch.compile(fn, **compile_kwargs)
+        self.failed = False
+
+    def __call__(self, *args, **kwargs):
+        if not self.failed:
+            try:
+                return self.compiled(*args, **kwargs)
+            except Exception as e:
+                self.failed = True
+                logging.getLogger(__name__).warning(
+                    "Compiling %s failed, falling back to eager mode: %s",
+                    getattr(self.eager, "__qualname__", self.eager),
+                    e,
+                )
+        return self.eager(*args, **kwargs)
+
+
+def is_uint8_rgb(image: Any, size: int) -> bool:
+    if isinstance(image, PIL.Image.Image):
+        return image.mode == "RGB" and image.size == (size, size)
+    return (
+        isinstance(image, np.ndarray)
+        and image.dtype == np.uint8
+        and image.shape == (size, size, 3)
+    )
+
+
 class ImagePreprocessor:
+    def __init__(self) -> None:
+        # staging tensors reused across calls; one per thread and name, so
+        # they are freed with their thread and a new shape replaces the old
+        self._local = threading.local()
+
+    def buffer(self, name: str, shape: Tuple[int, ...], dtype: torch.dtype) -> torch.Tensor:
+        if not hasattr(self._local, "buffers"):
+            self._local.buffers = {}
+        buffers: Dict[str, torch.Tensor] = self._local.buffers
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            # drop the old one first, so both are never alive at once
+            buffers.pop(name, None)
+            del buffer
+            buffer = buffers[name] = torch.empty(
+                shape, dtype=dtype, pin_memory=torch.cuda.is_available()
+            )
+        return buffer
+
+    def composite_foreground(
+        self,
+        images: List[Union[PIL.Image.Image, np.ndarray]],
+        size: int,
+        ratio: float,
+        background: float = 0.5,
+    ) -> torch.FloatTensor:
+        """
+        `resize_foreground`, alpha compositing onto a `background` gray and
+        the resize to `size` in one vectorized pass over a batch of RGBA
+        uint8 images of equal size, without building the padded canvas.
+
+        Each output pixel is sampled straight from the source through the
+        crop/pad/resize affine map (bilinear, after an integer box filter
+        for antialiasing). The result is a (B, size, size, 3) view of a
+        reused (pinned, when CUDA is available) buffer that stays valid
+        until the next call from the same thread.
+        """
+        first = np.asarray(images[0])
+        assert first.shape[-1] == 4
+        batch_size, height, width = len(images), first.shape[0], first.shape[1]
+        staged = self.buffer("rgba", (batch_size, height, width, 4), torch.uint8)
+        # one image-sized temporary at a time rather than a second batch
+        staged_np = staged.numpy()
+        staged_np[0] = first
+        for i in range(1, batch_size):
+            staged_np[i] = np.asarray(images[i])
+
+        # crop box of the non-transparent pixels, end-exclusive like
+        # resize_foreground
+        opaque = staged[..., 3] > 0
+        rows, cols = opaque.any(dim=2), opaque.any(dim=1)
+        if not bool(rows.any(dim=1).all()):
+            raise ValueError("Cannot composite an image without foreground")
+        y1 = rows.byte().argmax(dim=1)
+        y2 = height - 1 - rows.flip(1).byte().argmax(dim=1)
+        x1 = cols.byte().argmax(dim=1)
+        x2 = width - 1 - cols.flip(1).byte().argmax(dim=1)
+
+        # premultiplied difference to the background, zero outside the crop
+        # so that out-of-bounds samples come out as background
+        alpha = self.buffer("alpha", (batch_size, 1, height, width), torch.float32)
+        alpha.copy_(staged[..., 3].unsqueeze(1)).mul_(1 / 255.0)
+        for i in range(batch_size):
+            alpha[i, :, : y1[i]] = 0
+            alpha[i, :, y2[i] :] = 0
+            alpha[i, :, :, : x1[i]] = 0
+            alpha[i, :, :, x2[i] :] = 0
+        rgb = self.buffer("rgb", (batch_size, 3, height, width), torch.float32)
+        rgb.copy_(staged[..., :3].permute(0, 3, 1, 2))
+        rgb.mul_(1 / 255.0).sub_(background).mul_(alpha)
+
+        # square canvas around the crop, enlarged by 1 / ratio
+        h, w = (y2 - y1).double(), (x2 - x1).double()
+        side = torch.maximum(h, w)
+        canvas = (side / ratio).floor()
+        margin = ((canvas - side) / 2).floor()
+        top = y1 - ((side - h) / 2).floor() - margin
+        left = x1 - ((side - w) / 2).floor() - margin
+
+        pool = max(1, int(canvas.min().item() / size))
+        if pool > 1:
+            rgb = F.avg_pool2d(rgb, pool, ceil_mode=True)
+        pooled_h, pooled_w = rgb.shape[-2] * pool, rgb.shape[-1] * pool
+
+        theta = torch.zeros(batch_size, 2, 3, dtype=torch.float64)
+        theta[:, 0, 0] = canvas / pooled_w
+        theta[:, 0, 2] = (canvas + 2 * left) / pooled_w - 1
+        theta[:, 1, 1] = canvas / pooled_h
+        theta[:, 1, 2] = (canvas + 2 * top) / pooled_h - 1
+        grid = F.affine_grid(
+            theta.float(), (batch_size, 3, size, size), align_corners=False
+        )
+        sampled = F.grid_sample(
+            rgb, grid, mode="bilinear", padding_mode="zeros", align_corners=False
+        )
+
+        out = self.buffer("composited", (batch_size, size, size, 3), torch.float32)
+        out.copy_(sampled.permute(0, 2, 3, 1)).add_(background)
+        return out
+
     def convert_and_resize(
         self,
         image: Union[PIL.Image.Image, np.ndarray, torch.Tensor],
@@ -81,6 +219,8 @@ class ImagePreprocessor:
 
         if not batched:
             image = image[None, ...]
+        if image.shape[1:3] == (size, size):
+            return image if batched else image[0]
         image = F.interpolate(
             image.permute(0, 3, 1, 2),
             (size, size),
@@ -106,6 +246,15 @@ class ImagePreprocessor:
     ) -> Any:
         if isinstance(image, (np.ndarray, torch.FloatTensor)) and image.ndim == 4:
             image = self.convert_and_resize(image, size)
+        elif isinstance(image, list) and all(is_uint8_rgb(im, size) for im in image):
+            # already composited at the conditioning size: one uint8 -> float
+            # conversion for the whole batch, into a reused buffer
+            staged = self.buffer("images", (len(image), size, size, 3), torch.uint8)
+            staged_np = staged.numpy()
+            for i, im in enumerate(image):
+                staged_np[i] = np.asarray(im)
+            image = self.buffer("images_float", staged.shape, torch.float32)
+            image.copy_(staged).mul_(1 / 255.0)
         else:
             if not isinstance(image, list):
                 image = [image]
@@ -233,6 +382,11 @@ def scale_tensor(dat: torch.FloatTensor, inp_scale: ValidScale, tgt_scale: Valid
     return dat
 
 
+def trunc_exp(x: torch.Tensor) -> torch.Tensor:
+    # exp overflows fp16/bf16 for moderate densities, always evaluate in fp32
+    return torch.exp(x.float())
+
+
 def get_activation(name) -> Callable:
     if name is None:
         return lambda x: x
@@ -241,6 +395,8 @@ def get_activation(name) -> Callable:
         return lambda x: x
     elif name == "exp":
         return lambda x: torch.exp(x)
+    elif name == "trunc_exp":
+        return trunc_exp
     elif name == "sigmoid":
         return lambda x: torch.sigmoid(x)
     elif name == "tanh":
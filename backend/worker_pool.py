@@ -0,0 +1,411 @@
+import hashlib
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from tsr.models.transformer.attention import SlicedAttnProcessor
+from tsr.system import TSR
+
+
+def ensure_bundle(
+    model_path: str,
+    cache_root: Union[str, Path],
+    config_name: str = "config.yaml",
+    weight_name: str = "model.ckpt",
+) -> str:
+    """
+    Return an offline bundle for `model_path`, converting (once) a hub repo
+    or checkout into `cache_root`. Bundles are memory-mapped, so every
+    process loading one shares a single copy of the weights in the page
+    cache.
+    """
+    if TSR.read_bundle_manifest(model_path) is not None:
+        return model_path
+    name = hashlib.sha256(
+        f"{model_path}:{config_name}:{weight_name}".encode("utf-8")
+    ).hexdigest()[:16]
+    bundle_dir = os.path.join(str(cache_root), name)
+    manifest = TSR.read_bundle_manifest(bundle_dir)
+    # older conversions store unfused projections, which fusing copies
+    if manifest is None or not manifest.get("fused_projections"):
+        logging.info("Converting %s to a model bundle at %s", model_path, bundle_dir)
+        model = TSR.from_pretrained(
+            model_path, config_name=config_name, weight_name=weight_name
+        )
+        model.save_bundle(
+            bundle_dir, model_version=f"{model_path}:{config_name}:{weight_name}"
+        )
+    return bundle_dir
+
+
+def worker_cpus(index: int, threads: int) -> Optional[List[int]]:
+    """The block of `threads` CPUs worker `index` is pinned to, if available."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    start = index * threads
+    if start + threads > len(cpus):
+        return None
+    return cpus[start : start + threads]
+
+
+def load_worker_model(
+    bundle_dir: str,
+    precision: str = "fp32",
+    chunk_size: int = 8192,
+    quantize: bool = False,
+    quantized_cache_dir: Optional[str] = None,
+    fuse_projections: bool = False,
+    attention_memory_mb: float = 0,
+    online_softmax: bool = False,
+    compile: bool = False,
+    compile_mode: str = "default",
+    warmup_batch_size: int = 1,
+    mc_workers: int = 1,
+    mc_block_size: int = 64,
+    mc_executor: str = "thread",
+) -> TSR:
+    """
+    Load and configure a worker's model the way `ModelService` configures
+    its own, so scene codes and meshes match the model version it reports.
+    """
+    model = TSR.from_pretrained(
+        bundle_dir,
+        "config.yaml",
+        "model.ckpt",
+        quantize=quantize,
+        quantized_cache_dir=quantized_cache_dir,
+        # fused weights are mapped from the bundle, not copied
+        fuse_projections=fuse_projections,
+    )
+    model.set_precision(precision, "cpu")
+    model.renderer.set_chunk_size(chunk_size)
+    if attention_memory_mb > 0:
+        model.backbone.set_attn_processor(
+            SlicedAttnProcessor(attention_memory_mb, online_softmax=online_softmax)
+        )
+    if mc_executor == "process":
+        # daemonic workers cannot start processes of their own
+        logging.info("Inference workers run block marching cubes on threads")
+        mc_executor = "thread"
+    model.set_marching_cubes_workers(mc_workers, mc_block_size, mc_executor)
+    if compile:
+        model.enable_compile(mode=compile_mode)
+        # graphs are specialized on shapes, build them before serving
+        image = Image.new("RGB", (512, 512), (127, 127, 127))
+        with torch.no_grad():
+            for batch_size in range(1, warmup_batch_size + 1):
+                scene_codes = model([image] * batch_size, device="cpu")
+            # lattice decoder graphs depend on the grid size
+            model.extract_mesh(scene_codes[:1], has_vertex_color=False, resolution=256)
+    return model
+
+
+def _worker_main(
+    index: int,
+    generation: int,
+    bundle_dir: str,
+    threads: int,
+    cpus: Optional[List[int]],
+    precision: str,
+    chunk_size: int,
+    model_options: Dict[str, Any],
+    tasks: "mp.Queue",
+    results: "mp.Queue",
+):
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+    try:
+        model = load_worker_model(bundle_dir, precision, chunk_size, **model_options)
+    except Exception as e:
+        results.put(
+            (index, generation, None, False, f"worker {index} failed to load: {e!r}")
+        )
+        return
+    results.put((index, generation, None, True, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, op, args = task
+        try:
+            with torch.no_grad():
+                if op == "reconstruct":
+                    scene_codes = model(args["images"], device="cpu")
+                    payload = [code.numpy() for code in scene_codes]
+                elif op == "extract_mesh":
+                    payload = model.extract_mesh(
+                        torch.from_numpy(args["scene_codes"]),
+                        args["has_vertex_color"],
+                        **args["options"],
+                    )
+                else:
+                    raise ValueError(f"Unknown operation: {op}")
+            results.put((index, generation, task_id, True, payload))
+        except Exception as e:
+            results.put((index, generation, task_id, False, repr(e)))
+
+
+class InferenceWorkerPool:
+    """
+    N inference processes behind one front-end. Every worker memory-maps the
+    same model bundle, so the weights are resident once no matter how many
+    workers run, and gets `threads_per_worker` intra-op threads, pinned to
+    its own block of CPUs when `pin_cpus` is set and enough CPUs exist.
+
+    `model_options` (quantization, fused projections, sliced attention,
+    compilation, block marching cubes; see `load_worker_model`) configure
+    every worker's model like the front-end's.
+
+    Tasks go to whichever worker is idle first; `reconstruct` and
+    `extract_mesh` block until their result arrives and can be called from
+    many threads at once. Each worker has its own task queue and the
+    front-end tracks the task it is running, so a worker that dies (e.g.
+    OOM-killed) fails that task and is respawned without leaving a shared
+    queue locked. `task_timeout` additionally bounds every wait.
+    """
+
+    def __init__(
+        self,
+        bundle_dir: str,
+        num_workers: int,
+        threads_per_worker: int = 1,
+        pin_cpus: bool = True,
+        precision: str = "fp32",
+        chunk_size: int = 8192,
+        task_timeout: Optional[float] = None,
+        **model_options: Any,
+    ):
+        assert num_workers >= 1, "num_workers must be a positive integer."
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.task_timeout = task_timeout
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+        # fork is unsafe once torch has started its thread pools
+        self._context = mp.get_context("spawn")
+        self._results = self._context.Queue()
+        self._pending: Dict[int, Future] = {}
+        # submitted tasks not yet handed to a worker, and idle workers as
+        # (index, generation); a restart bumps the generation so stale
+        # entries of a dead worker are skipped
+        self._backlog: "queue.Queue" = queue.Queue()
+        self._idle: "queue.Queue" = queue.Queue()
+        self._running: Dict[int, int] = {}
+        self._generations = [0] * num_workers
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = threading.Event()
+
+        self._worker_args = [
+            (
+                bundle_dir,
+                threads_per_worker,
+                worker_cpus(index, threads_per_worker) if pin_cpus else None,
+                precision,
+                chunk_size,
+                model_options,
+            )
+            for index in range(num_workers)
+        ]
+        self._inboxes = [None] * num_workers
+        self._processes = [self._start_worker(index) for index in range(num_workers)]
+
+        loading = set(range(num_workers))
+        while loading:
+            try:
+                index, generation, _, ok, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                crashed = [i for i in loading if self._processes[i].exitcode]
+                if not crashed:
+                    continue
+                ok, payload = False, (
+                    f"worker {crashed[0]} exited with code "
+                    f"{self._processes[crashed[0]].exitcode} while loading"
+                )
+            if not ok:
+                self.close()
+                raise RuntimeError(payload)
+            loading.discard(index)
+            self._idle.put((index, generation))
+
+        self._threads = [
+            threading.Thread(target=target, name=name, daemon=True)
+            for target, name in (
+                (self._dispatch_results, "inference-results"),
+                (self._schedule_tasks, "inference-scheduler"),
+                (self._monitor_workers, "inference-monitor"),
+            )
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _start_worker(self, index: int):
+        self._inboxes[index] = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self._generations[index],
+                *self._worker_args[index],
+                self._inboxes[index],
+                self._results,
+            ),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _schedule_tasks(self):
+        while True:
+            index, generation = self._idle.get()
+            if index is None:
+                return
+            while True:
+                task = self._backlog.get()
+                if task is None:
+                    return
+                with self._lock:
+                    if generation != self._generations[index]:
+                        # the worker died while idle, its restart re-queues it
+                        self._backlog.put(task)
+                        break
+                    if task[0] not in self._pending:
+                        # timed out before a worker was free
+                        continue
+                    self._running[index] = task[0]
+                    self._inboxes[index].put(task)
+                break
+
+    def _monitor_workers(self, interval: float = 1.0):
+        while not self._closed.wait(interval):
+            for index, process in enumerate(self._processes):
+                # a clean exit is a worker that failed to load, which a
+                # restart would not fix
+                if process.is_alive() or process.exitcode == 0:
+                    continue
+                logging.error(
+                    "Inference worker %d exited with code %s, restarting it",
+                    index,
+                    process.exitcode,
+                )
+                with self._lock:
+                    if self._closed.is_set():
+                        return
+                    self._generations[index] += 1
+                    task_id = self._running.pop(index, None)
+                    future = self._pending.pop(task_id, None)
+                    if future is not None:
+                        self.failed += 1
+                    self.restarts += 1
+                    self._processes[index] = self._start_worker(index)
+                if future is not None:
+                    future.set_exception(
+                        RuntimeError(
+                            f"inference worker {index} exited with code "
+                            f"{process.exitcode}"
+                        )
+                    )
+
+    def _dispatch_results(self):
+        while True:
+            entry = self._results.get()
+            if entry is None:
+                return
+            index, generation, task_id, ok, payload = entry
+            with self._lock:
+                if task_id is not None:
+                    if self._running.get(index) == task_id:
+                        del self._running[index]
+                    future = self._pending.pop(task_id, None)
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+            if task_id is None:
+                # a restarted worker finished loading, or failed to
+                if not ok:
+                    logging.error(payload)
+                    continue
+            elif future is not None:
+                if ok:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload))
+            self._idle.put((index, generation))
+
+    def submit(self, op: str, **args: Any) -> Future:
+        future: Future = Future()
+        with self._lock:
+            task_id = next(self._ids)
+            self._pending[task_id] = future
+        self._backlog.put((task_id, op, args))
+        return future
+
+    def run(self, op: str, **args: Any) -> Any:
+        """Submit `op` and wait at most `task_timeout` for its result."""
+        future = self.submit(op, **args)
+        try:
+            return future.result(timeout=self.task_timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                # a late result is dropped by the dispatcher
+                for task_id, pending in list(self._pending.items()):
+                    if pending is future:
+                        del self._pending[task_id]
+                self.failed += 1
+            raise
+
+    def reconstruct(self, images: List[Image.Image]) -> List[torch.Tensor]:
+        scene_codes = self.run("reconstruct", images=images)
+        return [torch.from_numpy(code) for code in scene_codes]
+
+    def extract_mesh(
+        self, scene_codes: torch.Tensor, has_vertex_color: bool, **options: Any
+    ):
+        """`TSR.extract_mesh` in a worker; `options` are its keyword arguments."""
+        return self.run(
+            "extract_mesh",
+            scene_codes=np.ascontiguousarray(scene_codes.detach().cpu().numpy()),
+            has_vertex_color=has_vertex_color,
+            options=options,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "threads_per_worker": self.threads_per_worker,
+                "alive": sum(p.is_alive() for p in self._processes),
+                "pending": len(self._pending),
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed.set()
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._backlog.put(None)
+        self._idle.put((None, None))